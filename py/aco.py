@@ -14,6 +14,10 @@ from scipy.io import wavfile
 from scipy.fft import dct
 from tqdm.auto import tqdm
 
+import featurize
+import filterbank_tables
+import fft_model
+
 train_test_split = 0.75  # fraction to have as training data
 
 # ==================== DFE modelling ====================
@@ -130,11 +134,61 @@ def gen_dct_coefs():
 
 dct_coefs = gen_dct_coefs().astype(np.int64)
 
-def aco(signal, fft_override=None):
+def leading_one(x):
+    '''Log2 approximation of the log stage: the position of the leading one
+    in the lower 32 bits of each value, counted from 1 (0 for an input of 0).
+
+    Works on arrays of any shape, e.g. (50, 32) or batched (N, 50, 32). Every
+    32b value is exactly representable as a float64, so its frexp exponent is
+    exactly its bit length.
+    '''
+    x = np.bitwise_and(np.asarray(x, dtype=np.int64), 0xffffffff)
+    _, exponent = np.frexp(x.astype(np.float64))
+    return exponent.astype(np.uint8)
+
+def apply_filterbank_dense(power_spectrum, num_filters=32, fft_length=256,
+                           fs=16000):
+    '''Apply the quantized mel filterbank along the last axis of the power
+    spectrum with a dense dot over every bin.'''
+    filterbank = filterbank_tables.get_filterbank(num_filters, fft_length, fs)
+    return np.dot(power_spectrum, filterbank.T)
+
+def apply_filterbank(power_spectrum, num_filters=32, fft_length=256, fs=16000):
+    '''Apply the quantized mel filterbank along the last axis of the power
+    spectrum, e.g. of dims (50, 129) or batched (N, 50, 129).
+
+    Mirrors rtl/aco/filterbank: the spectrum is multiplied by the even and odd
+    coefficient rows, and each filter accumulates only the bins of its span.
+    Bit-exact with apply_filterbank_dense.
+    '''
+    coefs, starts = filterbank_tables.get_filterbank_spans(num_filters,
+                                                           fft_length, fs)
+    out = np.zeros(power_spectrum.shape[:-1] + (num_filters,), dtype=np.int64)
+    for parity in range(2):
+        if len(starts[parity]) == 0:  # a single filter has no odd row
+            continue
+        products = power_spectrum * coefs[parity]
+        out[..., parity::2] = np.add.reduceat(products, starts[parity], axis=-1)
+    return out
+
+def aco(signal, fft_override=None, prev_sample=0, exact_fft=False):
     '''Quantized python model of the ACO pipeline.
 
+    signal is a single clip of dims (16000,) or a batch of clips of dims
+    (N, 16000). Every stage operates along the trailing axes, so the
+    intermediate values gain the same leading batch axis. Any whole number of
+    20 ms frames may be supplied, e.g. a single (320,) frame.
+
     If fft_override is not None, use the value supplied as the fft output for
-    the rest of the calculations.'''
+    the rest of the calculations.
+
+    The FFT is np.fft.rfft scaled down by 8 like the RTL, or fft_model.rfft if
+    exact_fft is set. fft_model is meant to be bit-accurate but is not yet
+    checked against the RTL, see the fft and fft_wrapper benches.
+
+    prev_sample is the sample preceding the signal, seen by the preemphasis
+    delay. It is 0 at the start of a recording, and the last sample of the
+    previous frame when featurizing a stream frame by frame.'''
     fs = 16000
     signal = signal.astype(np.int16)  # increase bitwidth for preemphasis
     detect_max(signal, 'signal')
@@ -142,7 +196,7 @@ def aco(signal, fft_override=None):
     # Acoustic Featurization Constants
     FS = fs                                 # 16 KHz
     PERIOD = 1 / FS                         # 0.0625 ms
-    SIGNAL_LENGTH = len(signal) * PERIOD    # 1 s
+    SIGNAL_LENGTH = signal.shape[-1] * PERIOD  # 1 s
     FRAME_LENGTH = .02                      # 0.02 s = 20 ms = 320 samples
     NUM_MEL_FILTERS = 32                    # of Mel Scale filterbanks
     NUM_CEPSTRAL = 13                       # MFCC Output
@@ -151,8 +205,8 @@ def aco(signal, fft_override=None):
     # 1) preemphasis
     # =========================================================================
     # Delay by 1 cycle
-    rolled_signal = np.roll(signal, 1)
-    rolled_signal[0] = 0  # zero out initial value
+    rolled_signal = np.roll(signal, 1, axis=-1)
+    rolled_signal[..., 0] = prev_sample  # zero at the start of a recording
 
     # preemphasis coefficient of 31 / 32 = 0.96875, quantize via right shift
     scaled_rolled_signal = np.right_shift(31 * rolled_signal, 5)
@@ -164,18 +218,20 @@ def aco(signal, fft_override=None):
     # 2) framing
     # =========================================================================
     # Get NUM_SAMPLES_IN_FRAME-sized non-overlapping frames, truncate as needed
-    framing_out = np.split(preemphasis_out, SIGNAL_LENGTH / FRAME_LENGTH)
-    framing_out = np.asarray(framing_out)
-    framing_out = framing_out[:, :FFT_LENGTH]
+    n_frames = int(round(SIGNAL_LENGTH / FRAME_LENGTH))
+    framing_out = preemphasis_out.reshape(preemphasis_out.shape[:-1] +
+                                          (n_frames, -1))
+    framing_out = framing_out[..., :FFT_LENGTH]
 
     # 3) fft
     # TODO: Check 32b quantization, scaling
     # =========================================================================
-    # fft_out = np.fft.rfft(framing_out)
-    if fft_override is None:
-        fft_out = np.fft.rfft(framing_out) / 8  # RTL FFT scaled down by 8
-    else:
+    if fft_override is not None:
         fft_out = fft_override
+    elif exact_fft:
+        fft_out = fft_model.rfft(framing_out)  # fixed-point model of the RTL
+    else:
+        fft_out = np.fft.rfft(framing_out) / 8  # RTL FFT scaled down by 8
 
     # split into real and imag
     fft_out_real = fft_out.real
@@ -205,30 +261,20 @@ def aco(signal, fft_override=None):
 
     # 5) mel filterbank construction
     # =========================================================================
-    mfcc_filterbank = speechpy.feature.filterbanks(NUM_MEL_FILTERS,
-                                                   FFT_LENGTH,
-                                                   FS)[:,:129]
-
-    # quantize
-    mfcc_filterbank = (mfcc_filterbank * (2 ** 16 - 1)).astype(np.uint16)
+    # quantized to uint16 and built once per configuration, see
+    # filterbank_tables.py
 
     # 6) mel filterbank application
     # =========================================================================
     # shift by 16 to cancel initial quantization in step 5)
-    mfcc_out = np.dot(power_spectrum_out, mfcc_filterbank.T)
+    mfcc_out = apply_filterbank(power_spectrum_out, NUM_MEL_FILTERS,
+                                FFT_LENGTH, FS)
     mfcc_out = np.right_shift(mfcc_out, 16)
     detect_max(mfcc_out, 'mfcc_out')
 
     # 7) log
     # =========================================================================
-    n_frames, n_mfcc = mfcc_out.shape
-    log_out = np.zeros((n_frames, n_mfcc), dtype=np.uint8)
-    for i in range(n_frames):
-        for j in range(n_mfcc):
-            for k in range(31, -1, -1):
-                if mfcc_out[i,j] & (1 << k):
-                    log_out[i,j] = k + 1
-                    break
+    log_out = leading_one(mfcc_out)
     detect_max(log_out, 'log_out')
 
     # 8) dct
@@ -252,7 +298,7 @@ def aco(signal, fft_override=None):
 
     # =========================================================================
     # flatten for use in pipeline
-    out = quant_out.flatten()
+    out = quant_out.reshape(quant_out.shape[:-2] + (-1,))
 
     # collect intermediate values for RTL verification
     sigs = [preemphasis_out, framing_out, fft_out, power_spectrum_out,
@@ -260,15 +306,68 @@ def aco(signal, fft_override=None):
 
     return sigs
 
-def aco_with_dfe(fullfname):
-    '''Quantized python model of the ACO pipeline.'''
+def aco_batch(signals, out=None, chunk_size=8):
+    '''Quantized python model of the ACO pipeline over a batch of clips.
+
+    signals is of dims (N, 16000). The final flattened features of every clip
+    are written into out, a preallocated (N, 650) array that is created as
+    int8 if not supplied. Clips are processed chunk_size at a time to bound
+    the size of the intermediate values, which is fastest when they stay in
+    cache.
+    '''
+    n = signals.shape[0]
+    if out is None:
+        out = np.zeros((n, 13*50), dtype=np.int8)
+    for i in range(0, n, chunk_size):
+        out[i:i+chunk_size] = aco(signals[i:i+chunk_size])[-1]
+    return out
+
+class AcoStream:
+    '''Incremental model of the ACO pipeline over a stream of samples.
+
+    Samples are pushed in chunks of any size, and the features of each
+    completed 20 ms frame are returned as soon as it is complete. The
+    preemphasis delay and any partial frame are carried across calls, so the
+    concatenated outputs are identical to aco() on the concatenated input.
+    '''
+
+    FRAME_SAMPLES = 320  # 20 ms at 16 KHz
+    NUM_CEPSTRAL = 13
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pending = np.zeros(0, dtype=np.int16)  # samples of a partial frame
+        self.prev_sample = 0  # last sample of the previous frame
+
+    def push(self, samples):
+        '''Consume a chunk of samples, returning the int8 features of the
+        frames it completes, of dims (n_frames, 13).'''
+        samples = np.concatenate((self.pending, np.asarray(samples).astype(np.int16)))
+        n_frames = len(samples) // self.FRAME_SAMPLES
+        frames = samples[:n_frames * self.FRAME_SAMPLES]
+        self.pending = samples[n_frames * self.FRAME_SAMPLES:]
+        if n_frames == 0:
+            return np.zeros((0, self.NUM_CEPSTRAL), dtype=np.int8)
+        out = aco(frames, prev_sample=self.prev_sample)[-1]
+        self.prev_sample = frames[-1]
+        return out.reshape((n_frames, self.NUM_CEPSTRAL)).astype(np.int8)
+
+def dfe_with_wav(fullfname, model_type='fast'):
+    '''Read a .wav file and run it through the DFE quantization model.'''
     # Get raw 16b audio data
     fs, signal = wavfile.read(fullfname)
 
     # DFE quantization model
-    signal = pdm_model(signal, model_type='fast')
+    signal = pdm_model(signal, model_type=model_type)
     # signal = pdm_model(signal, model_type='accurate')
     detect_max(signal, 'signal')
+    return signal
+
+def aco_with_dfe(fullfname):
+    '''Quantized python model of the ACO pipeline.'''
+    signal = dfe_with_wav(fullfname)
     return aco(signal)[-1]
 
 def get_speechpy_features(fullfname):
@@ -309,7 +408,7 @@ def get_speechpy_features(fullfname):
 def get_fnames_group(group):
     '''Gets all the filenames (with directories) for a given class.'''
     dir = group + '/'
-    fnames = os.listdir(dir)
+    fnames = sorted(os.listdir(dir))
     fnames = [x for x in fnames if not x.startswith('.')]  # ignore .DS_Store
     fullnames = [dir + fname for fname in fnames]
     return fullnames
@@ -329,17 +428,37 @@ def get_fnames_and_labels():
     all_labels = np.array(all_labels)
     return all_fnames, all_labels
 
-def get_features_quantized(all_fnames):
-    '''Get a big list of mfcc features for each wav file.'''
+def featurize_wavs_quantized(fnames, params):
+    '''Run the DFE and ACO models over a list of .wav files.
+
+    Used as the featurizer of featurize.featurize_files, so it runs inside
+    the worker processes. Every clip is cut to 1 s, and shorter clips are
+    zero padded at the end, since aco_batch needs 16000 samples per clip.
+    '''
+    n_samples = 16000
+    signals = np.zeros((len(fnames), n_samples), dtype=np.int8)
+    for i, fname in enumerate(fnames):
+        signal = dfe_with_wav(fname, model_type=params['model_type'])
+        signal = signal[:n_samples]  # truncate, the rest stays zero padded
+        signals[i, :len(signal)] = signal
+    return aco_batch(signals)
+
+def get_features_quantized(all_fnames, n_workers=None):
+    '''Get a big list of mfcc features for each wav file.
+
+    Files are featurized in parallel by n_workers processes (all cores if
+    None) and cached on disk, see featurize.featurize_files, which shows the
+    progress. The bit widths recorded by detect_max stay in the process that
+    ran the models, so they are only printed when n_workers is 1, and then
+    only cover the clips that were not already cached.
+    '''
     n = len(all_fnames)
-    # n = 1
     print('num samples: ', n)
-    all_features = np.zeros((0, 13*50))
-    for i in tqdm(range(n)):
-        fname = all_fnames[i]
-        features = aco_with_dfe(fname)
-        all_features = np.vstack((all_features, features))
-    print_maxes()
+    params = {'model_type': 'fast'}
+    all_features = featurize.featurize_files(all_fnames, featurize_wavs_quantized,
+                                             params, n_workers=n_workers)
+    if n_workers == 1:
+        print_maxes()
     return all_features
 
 def shuffle_and_split(all_features, all_labels):
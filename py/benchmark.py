@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+'''Benchmarks comparing the batched software models against the per-sample
+reference implementations they replace.
+
+Run with: python benchmark.py
+'''
+
+import time
+import numpy as np
+
+import aco
+import pdm
+import numpy_arch as na
+import filterbank_tables
+import wake_stream
+
+
+def time_fn(fn, *args, repeats=3):
+    '''Return the best wall time in seconds of calling fn(*args).'''
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def print_result(name, n, t_ref, t_new):
+    print('{:30} n={:<6} reference {:8.3f} s   batched {:8.3f} s   '
+          'speedup {:7.1f}x'.format(name, n, t_ref, t_new, t_ref / t_new))
+
+def get_random_featuremaps(n):
+    return np.random.randint(-128, 128, (n, 50, 13)).astype(np.int8)
+
+# ==================== numpy_arch ====================
+
+def bench_conv_batch(n=256):
+    '''Per-sample conv1d_multi_kernel loop vs. the im2col conv1d_batch.'''
+    params = na.get_params()
+    x = get_random_featuremaps(n)
+
+    def reference():
+        for i in range(n):
+            na.get_numpy_pred_custom_params(x[i], params)
+
+    def batched():
+        na.get_conv_outputs_batch(x, params)
+
+    # check bit-exactness before timing
+    c1, c2 = na.get_conv_outputs_batch(x, params)
+    for i in range(n):
+        _, c1_exp, c2_exp = na.get_numpy_pred_custom_params(x[i], params)
+        assert np.array_equal(c1[i], c1_exp) and np.array_equal(c2[i], c2_exp)
+
+    print_result('conv1/conv2', n, time_fn(reference, repeats=1), time_fn(batched))
+
+def bench_pred_batch(n=256):
+    '''Per-sample get_numpy_pred loop vs. get_numpy_pred_batch.'''
+    x = np.random.randn(n, 650) * 40
+
+    def reference():
+        return np.array([na.get_numpy_pred(x[i:i+1, :])[0] for i in range(n)])
+
+    def batched():
+        return na.get_numpy_pred_batch(x)[0]
+
+    assert np.array_equal(reference(), batched())
+
+    print_result('get_numpy_pred', n, time_fn(reference, repeats=1), time_fn(batched))
+
+def bench_incremental_pred(n=200, hop=2):
+    '''Per-window get_numpy_pred_custom_params vs. IncrementalPred on a
+    window sliding by hop frames.'''
+    params = na.get_params()
+    stream = np.random.randint(-128, 128, (n*hop + 50, 13)).astype(np.int8)
+    starts = range(0, n*hop, hop)
+
+    def reference():
+        return [na.get_numpy_pred_custom_params(stream[s:s+50], params)[0]
+                for s in starts]
+
+    def incremental():
+        model = na.IncrementalPred(params)
+        return [model.pred(stream[s:s+50], s)[0] for s in starts]
+
+    assert np.array_equal(reference(), incremental())
+
+    print_result('sliding window pred', n, time_fn(reference, repeats=1),
+                 time_fn(incremental))
+
+def bench_max_pool(n=1000):
+    '''Original per-element max_pool_1d loop vs. the strided view reduction,
+    over conv1 outputs of odd and even lengths.'''
+    xs = [np.random.randint(-128, 128, (50 - i % 2, 8)).astype(np.int8)
+          for i in range(n)]
+
+    def reference():
+        outs = []
+        for x in xs:
+            out = np.zeros((int(np.ceil(x.shape[0] / 2)), x.shape[1]), dtype=np.int8)
+            for j in range(x.shape[1]):
+                for i in range(int(np.floor(x.shape[0] / 2))):
+                    out[i, j] = np.maximum(x[2*i, j], x[2*i+1, j])
+                if (x.shape[0] % 2 == 1):
+                    out[-1, j] = x[-1, j]
+            outs.append(out)
+        return outs
+
+    def vectorized():
+        return [na.max_pool_1d(x) for x in xs]
+
+    assert all(np.array_equal(a, b) for a, b in zip(reference(), vectorized()))
+
+    print_result('max_pool_1d', n, time_fn(reference, repeats=1), time_fn(vectorized))
+
+def bench_fc_batch(n=100000):
+    '''Per-sample int64 fc vs. fc_batch with its int32 accumulator.'''
+    params = na.get_params()
+    fcw, fcb = params[6], params[7]
+    x = np.random.randint(-128, 128, (n, 13, 16)).astype(np.int8)
+
+    def reference():
+        return np.array([np.matmul(x[i].flatten(), fcw, dtype=np.int64) + fcb
+                         for i in range(n)])
+
+    def batched():
+        return na.fc_batch(x, fcw, fcb)
+
+    assert na.fc_accumulator(x.dtype, fcw) == np.int32
+    assert np.array_equal(reference(), batched())
+
+    print_result('fc', n, time_fn(reference, repeats=1), time_fn(batched))
+
+def bench_wake_stream(n_hops=101, hop=1):
+    '''WakeStream vs. featurizing and scoring every window from scratch,
+    checking the logits are equal at every hop.'''
+    params = na.get_params()
+    frame = aco.AcoStream.FRAME_SAMPLES
+    pcm = np.random.randint(-128, 128, 16000 + (n_hops - 1) * hop * frame).astype(np.int8)
+    ends = [16000 + i * hop * frame for i in range(n_hops)]
+
+    def reference():
+        logits = []
+        for end in ends:
+            # the window's first frame follows the sample before it
+            prev_sample = pcm[end - 16001] if end > 16000 else 0
+            x = aco.aco(pcm[end-16000:end], prev_sample=prev_sample)[-1]
+            logits.append(na.get_numpy_pred_custom_params(
+                x.reshape((50, 13)), params, quantize_input=True)[0])
+        return np.array(logits)
+
+    def streaming():
+        detector = wake_stream.WakeStream(hop=hop, params=params)
+        return np.array([r[2] for r in detector.push(pcm)])
+
+    assert np.array_equal(reference(), streaming())
+
+    print_result('wake stream', n_hops, time_fn(reference, repeats=1),
+                 time_fn(streaming))
+
+# ==================== aco ====================
+
+def bench_filterbank_tables(configs=((32, 256), (40, 512))):
+    '''Building the RTL filterbank tables vs. their cached copies, for the
+    RTL configuration and a larger FFT. get_filterbank_spans checks every
+    filter lies within its span.'''
+    for num_filters, fft_length in configs:
+        filterbank_tables.get_filterbank_spans(num_filters, fft_length)
+
+        def build():
+            return filterbank_tables.get_even_odd_tables.__wrapped__(num_filters, fft_length)
+
+        def cached():
+            return filterbank_tables.get_even_odd_tables(num_filters, fft_length)
+
+        for a, b in zip(build(), cached()):
+            assert np.array_equal(a, b)
+
+        print_result('filterbank tables {}/{}'.format(num_filters, fft_length),
+                     1, time_fn(build), time_fn(cached))
+
+def bench_filterbank(n=256, configs=((32, 256), (40, 512), (33, 512))):
+    '''Dense filterbank dot vs. the sparse even/odd span filterbank, for the
+    RTL configuration, a larger FFT and an odd number of filters.'''
+    for num_filters, fft_length in configs:
+        n_bins = fft_length // 2 + 1
+        x = np.random.randint(0, 2**40, (n, 50, n_bins)).astype(np.int64)
+
+        def dense():
+            return aco.apply_filterbank_dense(x, num_filters, fft_length)
+
+        def sparse():
+            return aco.apply_filterbank(x, num_filters, fft_length)
+
+        assert np.array_equal(dense(), sparse())
+
+        print_result('mel filterbank {}/{}'.format(num_filters, fft_length), n,
+                     time_fn(dense), time_fn(sparse))
+
+def bench_aco_batch(n=256):
+    '''Per-clip aco loop vs. aco_batch.'''
+    x = np.random.randint(-128, 128, (n, 16000)).astype(np.int8)
+
+    def reference():
+        return np.array([aco.aco(x[i])[-1] for i in range(n)])
+
+    def batched():
+        return aco.aco_batch(x)
+
+    assert np.array_equal(reference(), batched())
+
+    print_result('aco', n, time_fn(reference, repeats=1), time_fn(batched))
+
+# ==================== pdm ====================
+
+def bench_pdm_err(n_samples=2000):
+    '''Original error feedback loop vs. the vectorized pcm_to_pdm_err.'''
+    x = np.random.randint(-2**15, 2**15, n_samples).astype(np.int16)
+
+    def reference():
+        x_rep = np.repeat(pdm.shift_zero_to_one(x), pdm.ratio_in)
+        n = len(x_rep)
+        y = np.zeros(n)
+        error = np.zeros(n+1)
+        for i in range(n):
+            y[i] = 1 if x_rep[i] >= error[i] else 0
+            error[i+1] = y[i] - x_rep[i] + error[i]
+        return y
+
+    def vectorized():
+        return pdm.pcm_to_pdm_err(x)
+
+    assert np.array_equal(reference(), vectorized())
+
+    print_result('pcm_to_pdm_err', n_samples, time_fn(reference, repeats=1),
+                 time_fn(vectorized))
+
+
+def main():
+    np.random.seed(0)
+    bench_conv_batch()
+    bench_pred_batch()
+    bench_incremental_pred()
+    bench_max_pool()
+    bench_fc_batch()
+    bench_wake_stream()
+    bench_filterbank_tables()
+    bench_filterbank()
+    bench_aco_batch()
+    bench_pdm_err()
+
+
+if __name__ == '__main__':
+    main()
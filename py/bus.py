@@ -0,0 +1,94 @@
+'''Packing of numpy vectors into the values of wide DUT buses for cocotb.
+
+A bus carries a vector of n_bits wide two's complement lanes, with element 0
+in the most significant bits, i.e. first in the binary string of the bus as
+in the RTL's packed arrays. The lanes are converted to and from the integer
+value of the bus with vectorized masks and shifts instead of formatting and
+parsing a binary string per element. Lanes are masked to n_bits when packing.
+
+Lanes of 8, 16, 32 and 64 bits map directly onto big-endian numpy dtypes.
+Other widths are shifted into place within a 64b word when the whole bus fits
+in one, e.g. the two 21b lanes of the FFT output, and go through the bits of
+the bus otherwise.
+'''
+
+import functools
+import numpy as np
+from cocotb.binary import BinaryValue
+
+DTYPE_BITS = (8, 16, 32, 64)  # lane widths with a numpy dtype
+
+
+@functools.lru_cache(maxsize=None)
+def lane_shifts(n_lanes, n_bits):
+    '''Shifts of each lane within a bus of up to 64b, element 0 highest.'''
+    shifts = np.arange(n_lanes - 1, -1, -1, dtype=np.uint64) * np.uint64(n_bits)
+    shifts.setflags(write=False)
+    return shifts
+
+@functools.lru_cache(maxsize=None)
+def bit_weights(n_bits):
+    '''Value of each bit of a lane, MSB first.'''
+    weights = np.uint64(1) << np.arange(n_bits - 1, -1, -1, dtype=np.uint64)
+    weights.setflags(write=False)
+    return weights
+
+def pack(int_arr, n_bits=8):
+    '''Pack a vector of n_bits lanes into the integer value of the bus.'''
+    x = np.asarray(int_arr).ravel()
+    if n_bits > 64 or x.dtype == object:  # lanes wider than numpy integers
+        value = 0
+        for lane in x.tolist():
+            value = (value << n_bits) | (int(lane) & ((1 << n_bits) - 1))
+        return value
+
+    if n_bits in DTYPE_BITS:  # casting wraps, i.e. masks, each lane
+        return int.from_bytes(x.astype('>i{}'.format(n_bits // 8)).tobytes(),
+                              'big')
+    lanes = x.astype(np.uint64) & np.uint64((1 << n_bits) - 1)
+    if x.size * n_bits <= 64:
+        return int(np.bitwise_or.reduce(lanes << lane_shifts(x.size, n_bits)))
+    bits = np.unpackbits(lanes.astype('>u8').view(np.uint8).reshape(-1, 8),
+                         axis=1)[:, 64-n_bits:].ravel()
+    pad = np.zeros(-bits.size % 8, dtype=np.uint8)  # align to the LSB
+    return int.from_bytes(np.packbits(np.concatenate((pad, bits))).tobytes(),
+                          'big')
+
+def unpack(value, n_lanes, n_bits=8, signed=True):
+    '''Split the integer value of a bus into a vector of n_lanes lanes.'''
+    n_total = n_lanes * n_bits
+    value &= (1 << n_total) - 1
+    if n_bits > 64:  # lanes wider than numpy integers
+        mask = (1 << n_bits) - 1
+        lanes = [(value >> (n_bits * i)) & mask for i in range(n_lanes)][::-1]
+        if signed:
+            lanes = [x - ((x >> (n_bits-1)) << n_bits) for x in lanes]
+        return np.array(lanes, dtype=object)
+
+    if n_bits in DTYPE_BITS:
+        dtype = '>{}{}'.format('i' if signed else 'u', n_bits // 8)
+        lanes = np.frombuffer(value.to_bytes(n_total // 8, 'big'), dtype=dtype)
+        return lanes.astype(np.uint64 if dtype == '>u8' else np.int64)
+    if n_total <= 64:
+        lanes = np.uint64(value) >> lane_shifts(n_lanes, n_bits)
+    else:
+        n_bytes = (n_total + 7) // 8
+        data = np.frombuffer(value.to_bytes(n_bytes, 'big'), dtype=np.uint8)
+        bits = np.unpackbits(data)[n_bytes*8 - n_total:]
+        lanes = bits.reshape(n_lanes, n_bits) @ bit_weights(n_bits)
+    lanes = (lanes & np.uint64((1 << n_bits) - 1)).astype(np.int64)
+    if signed:  # sign extend from the top bit of the lane
+        lanes <<= 64 - n_bits
+        lanes >>= 64 - n_bits
+    return lanes
+
+def np2bv(int_arr, n_bits=8):
+    '''Convert a vector of n_bits integers to a cocotb BinaryValue.'''
+    n_total = np.asarray(int_arr).size * n_bits
+    return BinaryValue(value=pack(int_arr, n_bits), n_bits=n_total,
+                       bigEndian=False)
+
+def bv2np(bv, n_bits=8, signed=True):
+    '''Convert a cocotb BinaryValue, e.g. a handle's value, to a vector of
+    n_bits integers.'''
+    return unpack(bv.integer, len(bv) // n_bits, n_bits, signed)
@@ -0,0 +1,186 @@
+'''CFG memory image of the network parameters for loading the DUT in cocotb.
+
+The parameters of numpy_arch.get_params() are turned once into the list of
+CFG stores that write them, with the address map of rtl/cfg/cfg/cfg.v, and
+into the contents of the conv_mem and fc_mem arrays the stores produce. The
+image is then loaded into the DUT in one of three ways:
+- 'sequential': one cfg_store at a time, six Wishbone writes each waiting for
+  its ack, as the firmware does
+- 'burst': the stores as one stream of pipelined Wishbone writes, one per
+  clock without waiting for the acks, only rewriting the CFG data registers
+  whose value changes between stores
+- 'backdoor': the memory contents deposited directly into the dffram arrays
+  of the conv_mem and fc_mem instances, taking no simulation time
+
+The benches default to 'sequential'. test_cfg_image of rtl/cfg/cfg checks the
+other two read back through cfg_load the same as the sequential stores.
+'''
+
+import numpy as np
+from cocotb.triggers import FallingEdge
+
+# Wishbone registers of cfg.v
+WB_BASE = 0x30000000
+WB_ADDR = WB_BASE + 0x00
+WB_CTRL = WB_BASE + 0x04
+WB_DATA = [WB_BASE + 0x08, WB_BASE + 0x0C,
+           WB_BASE + 0x10, WB_BASE + 0x14]  # data_0 (LSB) to data_3 (MSB)
+CTRL_STORE = 0x1
+
+# Wakey Wakey address space, the weight offsets are in order of filter tap
+CONV_OFFSETS = {1: [0x20, 0x10, 0x00, 0x30, 0x40],  # weights x3, bias, shift
+                2: [0x70, 0x60, 0x50, 0x80, 0x90]}
+FC_WEIGHT_OFFSETS = [0x100, 0x200]
+FC_BIAS_OFFSETS = [0x300, 0x400]
+
+MODES = ['sequential', 'burst', 'backdoor']
+
+
+def pack_vectors(vectors):
+    '''Pack rows of up to 16 int8 values into the 4 32b CFG data words, in
+    order [data_3, data_2, data_1, data_0], the last value in the LSB.'''
+    n, length = vectors.shape
+    assert length <= 16
+    full = np.zeros((n, 16), dtype=np.uint8)
+    full[:, 16-length:] = vectors.astype(np.int8).view(np.uint8)
+    return full.view('>u4').astype(np.uint32)
+
+def pack_scalars(values):
+    '''CFG data words of 32b values stored in data_0.'''
+    words = np.zeros((len(values), 4), dtype=np.uint32)
+    words[:, 3] = np.asarray(values).astype(np.int64) & 0xffffffff
+    return words
+
+def get_cfg_stores(params):
+    '''Addresses and data words of the CFG stores writing params.
+
+    Returns addrs of dims (n_stores,) and words of dims (n_stores, 4), in
+    order [data_3, data_2, data_1, data_0], stored in the same order as the
+    sequential cfg_store loops of the testbenches.
+    '''
+    c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = params
+    addrs, words = [], []
+    for conv_num, w, b, s in [(1, c1w, c1b, c1s), (2, c2w, c2b, c2s)]:
+        filter_width, n_channels, n_filters = w.shape
+        offsets = CONV_OFFSETS[conv_num]
+        for j in range(filter_width):  # weight banks
+            addrs.append(offsets[j] + np.arange(n_filters))
+            words.append(pack_vectors(w[j].T))
+        addrs.append(offsets[3] + np.arange(n_filters))  # bias bank
+        words.append(pack_scalars(b))
+        addrs.append(np.array([offsets[4]]))  # shift bank
+        words.append(pack_scalars([s]))
+
+    in_length, n_classes = fcw.shape
+    # reorder to the order the features leave conv2
+    fcw = fcw.reshape(13, 16, n_classes).transpose((1, 0, 2)).reshape(-1, n_classes)
+    for j in range(n_classes):
+        addrs.append(FC_WEIGHT_OFFSETS[j] + np.arange(in_length))
+        words.append(pack_scalars(fcw[:, j]))
+    for j in range(n_classes):
+        addrs.append(np.array([FC_BIAS_OFFSETS[j]]))
+        words.append(pack_scalars([fcb[j]]))
+    return np.concatenate(addrs), np.concatenate(words)
+
+def get_burst(addrs, words):
+    '''Wishbone (address, data) writes performing the stores back to back.
+
+    Each store writes the address, the data registers that do not already
+    hold its words, and the store command.
+    '''
+    stream = []
+    held = [None] * 4  # contents of data_0 to data_3
+    for addr, store_words in zip(addrs.tolist(), words.tolist()):
+        stream.append((WB_ADDR, addr))
+        for k in range(4):
+            if held[k] != store_words[3-k]:
+                held[k] = store_words[3-k]
+                stream.append((WB_DATA[k], held[k]))
+        stream.append((WB_CTRL, CTRL_STORE))
+    return stream
+
+def get_mem_image(addrs, words):
+    '''Model of the memory writes of the stores in cfg.v.
+
+    Returns a dict from (block, bank) to a dict from index to the value
+    written, where block is 'conv1', 'conv2' or 'fc' and bank is the
+    rd_wr_bank of the block's memory.
+    '''
+    image = {}
+    for addr, (d3, d2, d1, d0) in zip(addrs.tolist(), words.tolist()):
+        if addr <= 0x40:  # conv1
+            key = ('conv1', (addr >> 4) & 0x7)
+            index = addr & 0x7
+            value = ((d3 & 0xff) << 96) | (d2 << 64) | (d1 << 32) | d0
+        elif 0x50 <= addr <= 0x90:  # conv2
+            key = ('conv2', ((addr >> 4) - 5) & 0x7)
+            index = addr & 0xf
+            value = (d1 << 32) | d0
+        elif 0x100 <= addr <= 0x400:  # fc
+            key = ('fc', ((addr >> 8) - 1) & 0x3)
+            index = addr & 0xff
+            value = d0
+        else:
+            raise ValueError('CFG address 0x{:x} is unmapped'.format(addr))
+        image.setdefault(key, {})[index] = value
+    return image
+
+def deposit(handle, value):
+    '''Write value, truncated to the width of handle, into a signal.'''
+    handle <= value & ((1 << len(handle)) - 1)
+
+def write_backdoor(wrd, image):
+    '''Deposit a memory image into the conv_mem and fc_mem arrays under the
+    wrd instance.'''
+    for (block, bank), values in image.items():
+        if block == 'fc':
+            mem_inst = wrd.fc_inst.fc_mem_inst
+            n_weight_banks = 2
+        else:
+            mem_inst = getattr(wrd, block).conv_mem_inst
+            n_weight_banks = 3
+        for index, value in values.items():
+            if bank < n_weight_banks:
+                ram = mem_inst.weight_banks[bank].weight_ram_inst
+                deposit(ram.mem[index], value)
+            elif block == 'fc':
+                ram = mem_inst.bias_banks[bank - n_weight_banks].bias_ram_inst
+                deposit(ram.mem[index], value)
+            elif bank == n_weight_banks:
+                deposit(mem_inst.bias_ram_inst.mem[index], value)
+            else:
+                deposit(mem_inst.shift_data_out, value)
+
+async def write_burst(dut, stream):
+    '''Issue a stream of Wishbone writes, one per clock, holding the strobe.'''
+    dut.wbs_stb_i <= 1
+    dut.wbs_cyc_i <= 1
+    dut.wbs_we_i  <= 1
+    dut.wbs_sel_i <= 0xF
+    for addr, data in stream:
+        dut.wbs_adr_i <= addr
+        dut.wbs_dat_i <= data
+        await FallingEdge(dut.clk_i)
+
+    dut.wbs_stb_i <= 0
+    dut.wbs_cyc_i <= 0
+    dut.wbs_we_i  <= 0
+    dut.wbs_sel_i <= 0x0
+    dut.wbs_dat_i <= 0x0
+    dut.wbs_adr_i <= 0x0
+    # ack_o lags the strobe by two cycles, let the acks of the last writes
+    # drain so they are not mistaken for the ack of a later transaction
+    for _ in range(2):
+        await FallingEdge(dut.clk_i)
+
+async def load(dut, wrd, params, mode='burst'):
+    '''Load the network parameters into the DUT with mode 'burst' or
+    'backdoor', wrd being the handle of the wrd instance.'''
+    stores = get_cfg_stores(params)
+    if mode == 'burst':
+        await write_burst(dut, get_burst(*stores))
+    elif mode == 'backdoor':
+        write_backdoor(wrd, get_mem_image(*stores))
+        await FallingEdge(dut.clk_i)
+    else:
+        raise ValueError('Unknown CFG load mode {}'.format(mode))
@@ -1,15 +1,73 @@
 import os
+import json
 import pathlib
 from scipy.io import wavfile
 import speechpy
 import numpy as np
 
+import featurize
+
 
 cache_dir = pathlib.Path(__file__).parent.absolute()
 cache_fnames = ['x_train.npy', 'y_train.npy', 'x_test.npy', 'y_test.npy']
-
-
-def cache_features():
+index_fname = 'features_index.json'
+splits = {'train': ('x_train.npy', 'y_train.npy'),
+          'test': ('x_test.npy', 'y_test.npy')}
+
+
+# parameters
+p = {'num_mfcc_cof': 13,
+     'frame_length': 0.02,
+     'frame_stride': 0.02,
+     'filter_num': 32,
+     'fft_length': 256,
+     'window_size': 101,
+     'low_frequency': 300,
+     'preemph_cof': 0.98}
+
+
+def get_features(fullfname, p=p):
+    '''Reads a .wav file and outputs the MFCC features.'''
+    try:
+        fs, data = wavfile.read(fullfname)
+    except ValueError:
+        print('failed to read file {}, continuing'.format(fullfname))
+        return np.zeros(650)
+
+    # generate features
+    preemphasized = speechpy.processing.preemphasis(data, cof=p['preemph_cof'], shift=1)
+    mfcc = speechpy.feature.mfcc(preemphasized, fs, frame_length=p['frame_length'],
+                                  frame_stride=p['frame_stride'], num_cepstral=p['num_mfcc_cof'],
+                                  num_filters=p['filter_num'], fft_length=p['fft_length'],
+                                  low_frequency=p['low_frequency'])
+    #print('mfcc shape', mfcc.shape)
+    # TODO: Why is the output shape here (49, 13) and not (50, 13)?
+    # For now just repeat last frame:
+    mfcc2 = np.zeros((50, 13))
+    mfcc2[:-1,:] = mfcc
+    mfcc2[-1,:] = mfcc[-1,:]
+
+    mfcc_cmvn = speechpy.processing.cmvnw(mfcc2, win_size=p['window_size'], variance_normalization=True)
+
+    flattened = mfcc_cmvn.flatten()
+    return flattened
+
+
+def get_features_files(fnames, p):
+    '''Featurizer for featurize.featurize_files over a list of .wav files.'''
+    return np.array([get_features(fname, p) for fname in fnames])
+
+
+def get_fnames(group):
+    '''Gets all the filenames (with directories) for a given class.'''
+    group_dir = cache_dir / group
+    fnames = sorted(os.listdir(group_dir))
+    fnames = [x for x in fnames if not x.startswith('.')]  # ignore .DS_Store
+    fullnames = [group_dir / fname for fname in fnames]
+    return fullnames
+
+
+def cache_features(n_workers=None):
     # download and unzip keywords dataset
     zip_fname = str(cache_dir / 'keywords2.zip')
     os.system('curl https://cdn.edgeimpulse.com/datasets/keywords2.zip -o ' + zip_fname)
@@ -17,50 +75,6 @@ def cache_features():
 
     train_test_split = 0.75  # fraction to have as training data
 
-    # parameters
-    p = {'num_mfcc_cof': 13,
-         'frame_length': 0.02,
-         'frame_stride': 0.02,
-         'filter_num': 32,
-         'fft_length': 256,
-         'window_size': 101,
-         'low_frequency': 300,
-         'preemph_cof': 0.98}
-
-    def get_features(fullfname):
-        '''Reads a .wav file and outputs the MFCC features.'''
-        try:
-            fs, data = wavfile.read(fullfname)
-        except ValueError:
-            print('failed to read file {}, continuing'.format(fullfname))
-            return np.zeros(650)
-
-        # generate features
-        preemphasized = speechpy.processing.preemphasis(data, cof=p['preemph_cof'], shift=1)
-        mfcc = speechpy.feature.mfcc(preemphasized, fs, frame_length=p['frame_length'],
-                                      frame_stride=p['frame_stride'], num_cepstral=p['num_mfcc_cof'],
-                                      num_filters=p['filter_num'], fft_length=p['fft_length'],
-                                      low_frequency=p['low_frequency'])
-        #print('mfcc shape', mfcc.shape)
-        # TODO: Why is the output shape here (49, 13) and not (50, 13)?
-        # For now just repeat last frame:
-        mfcc2 = np.zeros((50, 13))
-        mfcc2[:-1,:] = mfcc
-        mfcc2[-1,:] = mfcc[-1,:]
-
-        mfcc_cmvn = speechpy.processing.cmvnw(mfcc2, win_size=p['window_size'], variance_normalization=True)
-
-        flattened = mfcc_cmvn.flatten()
-        return flattened
-
-    def get_fnames(group):
-        '''Gets all the filenames (with directories) for a given class.'''
-        group_dir = cache_dir / group
-        fnames = os.listdir(group_dir)
-        fnames = [x for x in fnames if not x.startswith('.')]  # ignore .DS_Store
-        fullnames = [group_dir / fname for fname in fnames]
-        return fullnames
-
     # collect a big list of filenames and a big list of labels
     all_fnames = []
     all_labels = []
@@ -73,13 +87,11 @@ def cache_features():
             for i in range(len(fnames)):
                 all_labels.append(label)
 
-    # get a big list of mfcc features
+    # get a big list of mfcc features, featurized in parallel and cached
     n = len(all_fnames)
     print('num samples: ', n)
-    all_features = np.zeros((0, 13*50))
-    for fname in all_fnames:
-        features = get_features(fname)
-        all_features = np.vstack((all_features, features))
+    all_features = featurize.featurize_files(all_fnames, get_features_files, p,
+                                             n_workers=n_workers)
     all_labels = np.array(all_labels)
 
     # shuffle the data randomly
@@ -87,6 +99,7 @@ def cache_features():
     np.random.shuffle(idx)
     features_shuffled = all_features[idx,:]
     labels_shuffled = all_labels[idx]
+    sources = [os.path.relpath(all_fnames[i], cache_dir) for i in idx]
 
     # split the data into train and test sets
     split = int(train_test_split * n)
@@ -100,19 +113,83 @@ def cache_features():
         fname = cache_dir / cache_fnames[i]
         with open(fname, 'wb') as f:
             np.save(f, data[i])
+    write_index(sources[:split], sources[split:])
 
     return X, Y, Xtest, Ytest
 
 
-def load_npy(fname):
-    with open(fname, 'rb') as f:
-        return np.load(f)
-
-
-if not os.path.exists(cache_dir / cache_fnames[0]):
-    X, Y, Xtest, Ytest = cache_features()
-else:
-    X = load_npy(cache_dir / cache_fnames[0])
-    Y = load_npy(cache_dir / cache_fnames[1])
-    Xtest = load_npy(cache_dir / cache_fnames[2])
-    Ytest = load_npy(cache_dir / cache_fnames[3])
+# ==================== Feature store ====================
+# The cached features are kept as .npy files which are memory-mapped on first
+# use, so only the rows that are indexed are ever read from disk. An index
+# file describes the shape, dtype, and per-row label and source path of each
+# split so that it can be inspected without opening the arrays.
+
+_store = {}
+
+
+def write_index(train_sources=None, test_sources=None):
+    '''Write the index file describing the cached .npy feature arrays.
+
+    Sources are the .wav paths of each row relative to cache_dir, or None
+    when they are unknown, e.g. for caches created by an older version.
+    '''
+    index = {}
+    for split, sources in zip(splits, [train_sources, test_sources]):
+        x_fname, y_fname = splits[split]
+        x = np.load(cache_dir / x_fname, mmap_mode='r')
+        y = np.load(cache_dir / y_fname, mmap_mode='r')
+        if sources is None:
+            sources = [None] * x.shape[0]
+        index[split] = {'x_fname': x_fname,
+                        'y_fname': y_fname,
+                        'shape': list(x.shape),
+                        'dtype': str(x.dtype),
+                        'labels': [int(label) for label in y],
+                        'sources': sources}
+    with open(cache_dir / index_fname, 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def get_index():
+    '''Return the feature store index, creating the store if needed.'''
+    if 'index' not in _store:
+        if not os.path.exists(cache_dir / cache_fnames[0]):
+            cache_features()
+        if not os.path.exists(cache_dir / index_fname):
+            write_index()  # index an existing cache
+        with open(cache_dir / index_fname) as f:
+            _store['index'] = json.load(f)
+    return _store['index']
+
+
+def get_split(split):
+    '''Return memory-mapped (features, labels) arrays for 'train' or 'test'.'''
+    if split not in _store:
+        index = get_index()[split]
+        x = np.load(cache_dir / index['x_fname'], mmap_mode='r')
+        y = np.load(cache_dir / index['y_fname'], mmap_mode='r')
+        assert list(x.shape) == index['shape'], 'stale feature index'
+        _store[split] = (x, y)
+    return _store[split]
+
+
+def get_num_samples(split='train'):
+    return get_index()[split]['shape'][0]
+
+
+def get_source(index, split='train'):
+    '''Return the .wav path of a sample, or None if unknown.'''
+    source = get_index()[split]['sources'][index]
+    return None if source is None else cache_dir / source
+
+
+def __getattr__(name):
+    '''Lazily open X, Y, Xtest, and Ytest on first access.'''
+    if name in ('X', 'Y'):
+        x, y = get_split('train')
+        return y if name == 'Y' else x
+    if name in ('Xtest', 'Ytest'):
+        x, y = get_split('test')
+        return y if name == 'Ytest' else x
+    raise AttributeError('module {} has no attribute {}'.format(__name__, name))
@@ -0,0 +1,113 @@
+'''Parallel featurization of wav datasets with an on-disk feature cache.
+
+Files are split into chunks which are featurized by a pool of worker
+processes, and the results are assembled in the original file order. The
+features of every clip are cached under a key made from a hash of the file
+contents and a hash of the featurization pipeline (the featurizer function,
+the source of its module, and its parameters), so re-runs only recompute
+clips that changed.
+'''
+
+import os
+import sys
+import json
+import hashlib
+import pathlib
+import numpy as np
+from tqdm.auto import tqdm
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_DIR = pathlib.Path(__file__).parent.absolute() / 'feature_cache'
+
+
+def file_hash(fname):
+    '''SHA-1 hex digest of the contents of a file.'''
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def pipeline_hash(featurizer, params):
+    '''SHA-1 hex digest identifying a featurizer and its parameters.
+
+    The source of the module defining the featurizer is included so that
+    changes to the model invalidate previously cached features.
+    '''
+    h = hashlib.sha1()
+    h.update('{}.{}'.format(featurizer.__module__,
+                            featurizer.__qualname__).encode())
+    module_fname = getattr(sys.modules[featurizer.__module__], '__file__', None)
+    if module_fname is not None:
+        with open(module_fname, 'rb') as f:
+            h.update(f.read())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+def featurize_chunk(fnames, featurizer, params, pipeline_key, cache_dir):
+    '''Featurize a chunk of files, using and filling the cache.
+
+    featurizer(fnames, params) must return an array of dims
+    (len(fnames), n_features). Returns the features of every file in fnames.
+    '''
+    cache_dir = pathlib.Path(cache_dir) if cache_dir is not None else None
+    features = [None] * len(fnames)
+    cache_fnames = [None] * len(fnames)
+    misses = []
+    for i, fname in enumerate(fnames):
+        if cache_dir is None:
+            misses.append(i)
+            continue
+        key = hashlib.sha1((file_hash(fname) + pipeline_key).encode()).hexdigest()
+        cache_fnames[i] = cache_dir / (key + '.npy')
+        if os.path.exists(cache_fnames[i]):
+            features[i] = np.load(cache_fnames[i])
+        else:
+            misses.append(i)
+
+    if len(misses) > 0:
+        computed = featurizer([fnames[i] for i in misses], params)
+        for i, x in zip(misses, computed):
+            features[i] = x
+            if cache_dir is not None:
+                # write then rename so concurrent readers never see a partial file
+                tmp_fname = str(cache_fnames[i]) + '.{}.tmp'.format(os.getpid())
+                with open(tmp_fname, 'wb') as f:
+                    np.save(f, x)
+                os.replace(tmp_fname, cache_fnames[i])
+
+    return np.array(features)
+
+def featurize_files(fnames, featurizer, params, n_features=13*50,
+                    n_workers=None, chunk_size=64, cache_dir=CACHE_DIR):
+    '''Featurize a list of files in parallel, returning (len(fnames), n_features).
+
+    featurizer: module level function taking (fnames, params) and returning
+                the features of every file, run inside the worker processes
+    params: json serializable dict of parameters passed to the featurizer and
+            included in the cache key
+    n_workers: number of worker processes, os.cpu_count() if None, or 1 to
+               run in this process
+    cache_dir: directory of the on-disk cache, or None to disable caching
+
+    The output order always matches the order of fnames.
+    '''
+    n = len(fnames)
+    fnames = [str(fname) for fname in fnames]
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_dir = str(cache_dir)
+    pipeline_key = pipeline_hash(featurizer, params)
+
+    chunks = [fnames[i:i+chunk_size] for i in range(0, n, chunk_size)]
+    args = (chunks, [featurizer] * len(chunks), [params] * len(chunks),
+            [pipeline_key] * len(chunks), [cache_dir] * len(chunks))
+
+    out = np.zeros((n, n_features))
+    if n_workers == 1:
+        results = map(featurize_chunk, *args)
+        for i, x in enumerate(tqdm(results, total=len(chunks))):
+            out[i*chunk_size : i*chunk_size + len(x)] = x
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = executor.map(featurize_chunk, *args)
+            for i, x in enumerate(tqdm(results, total=len(chunks))):
+                out[i*chunk_size : i*chunk_size + len(x)] = x
+    return out
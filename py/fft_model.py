@@ -0,0 +1,180 @@
+'''Bit-accurate model of the fixed-point FFT in rtl/lib/fft.
+
+rtl/lib/fft is a 256 point pipelined decimation in frequency FFT (fftmain)
+made of six butterfly stages (fftstage and butterfly, rounding with
+convround and twiddles from cmem_*.hex), a quarter stage (qtrstage), a last
+stage (laststage) and a bit reversal. Each stage is modelled over whole
+blocks of samples with integer arithmetic, so frames of any leading batch
+dims, e.g. (50, 256) or (N, 50, 256), are transformed at once. The outputs
+are meant to be identical to the RTL, which the fft and fft_wrapper benches
+check; until they pass, aco.aco only uses this model with exact_fft set.
+'''
+
+import pathlib
+import functools
+import numpy as np
+
+FFT_DIR = pathlib.Path(__file__).parent.absolute() / '../rtl/lib/fft'
+FFT_LEN = 256
+LG_FFT_LEN = 8
+
+# fftstage parameters of each butterfly stage in fftmain.v:
+# (IWIDTH, CWIDTH, OWIDTH, LGSPAN, BFLYSHIFT, COEFFILE)
+BFLY_STAGES = [(16, 20, 17, 7, 0, 'cmem_256.hex'),
+               (17, 21, 18, 6, 0, 'cmem_128.hex'),
+               (18, 22, 18, 5, 0, 'cmem_64.hex'),
+               (18, 22, 19, 4, 0, 'cmem_32.hex'),
+               (19, 23, 19, 3, 0, 'cmem_16.hex'),
+               (19, 23, 20, 2, 0, 'cmem_8.hex')]
+QTR_STAGE = (20, 20, 0)   # qtrstage IWIDTH, OWIDTH, SHIFT
+LAST_STAGE = (20, 21, 1)  # laststage IWIDTH, OWIDTH, SHIFT
+
+
+def wrap(x, n_bits):
+    '''Interpret the lower n_bits of x as a two's complement value, in place
+    if x is a temporary array.'''
+    offset = 1 << (n_bits - 1)
+    x += offset
+    x &= (1 << n_bits) - 1
+    x -= offset
+    return x
+
+def convround(x, iwid, owid, shift):
+    '''Model of convround.v: drop the top shift bits of an iwid bit value and
+    round to owid bits, rounding half to even.'''
+    if iwid == owid:
+        return wrap(x.copy(), owid)
+    if iwid - shift <= owid:
+        return wrap(x.copy(), iwid - shift)
+    n_drop = iwid - shift - owid
+    # adding just under half, plus one if the truncated value is odd, rounds
+    # half to even
+    odd = (x >> n_drop) & 1
+    odd += x + ((1 << (n_drop - 1)) - 1)
+    odd >>= n_drop
+    return wrap(odd, owid)
+
+def unblock(x, n_block_dims):
+    '''Flatten the trailing block dims of x back into a single sample axis.'''
+    return x.reshape(x.shape[:-n_block_dims] + (-1,))
+
+@functools.lru_cache(maxsize=None)
+def read_cmem(fname, cwidth):
+    '''Read the real and imaginary twiddle factors of a cmem hex file.'''
+    words = [int(line, 16) for line in open(FFT_DIR / fname)
+             if line.strip() and not line.startswith('//')]
+    words = np.array(words, dtype=np.int64)
+    coef_r = wrap(words >> cwidth, cwidth)
+    coef_i = wrap(words.copy(), cwidth)
+    coef_r.setflags(write=False)
+    coef_i.setflags(write=False)
+    return coef_r, coef_i
+
+def butterfly_stage(re, im, iwidth, cwidth, owidth, lgspan, shift, coeffile):
+    '''Model of fftstage with butterfly.v.
+
+    Each block of 2*span samples is split into left (first half) and right
+    (second half) inputs. The block becomes the rounded sums followed by the
+    rounded differences times the twiddle factors.
+    '''
+    span = 1 << lgspan
+    coef_r, coef_i = read_cmem(coeffile, cwidth)
+    blocks = re.shape[:-1] + (-1, 2, span)
+    re = re.reshape(blocks)
+    im = im.reshape(blocks)
+
+    sum_r = re[..., 0, :] + re[..., 1, :]
+    sum_i = im[..., 0, :] + im[..., 1, :]
+    dif_r = re[..., 0, :] - re[..., 1, :]
+    dif_i = im[..., 0, :] - im[..., 1, :]
+
+    # three multiply complex product, exact at the widths used in the RTL
+    p_one = coef_r * dif_r
+    p_two = coef_i * dif_i
+    p_three = (coef_r + coef_i) * (dif_r + dif_i)
+    mpy_r = p_one - p_two
+    mpy_i = p_three - p_one - p_two
+
+    # the left output is scaled up to line up with the twiddle factors
+    mpy_width = cwidth + iwidth + 3
+    out_r = np.empty(re.shape, dtype=np.int64)
+    out_i = np.empty(im.shape, dtype=np.int64)
+    rnd = lambda x: convround(x, mpy_width, owidth, shift + 4)
+    out_r[..., 0, :] = rnd(sum_r << (cwidth - 2))
+    out_i[..., 0, :] = rnd(sum_i << (cwidth - 2))
+    out_r[..., 1, :] = rnd(mpy_r)
+    out_i[..., 1, :] = rnd(mpy_i)
+    return unblock(out_r, 3), unblock(out_i, 3)
+
+def qtr_stage(re, im, iwidth, owidth, shift):
+    '''Model of qtrstage.v, a span 2 butterfly where the twiddle of the second
+    difference is -j.'''
+    blocks = re.shape[:-1] + (-1, 2, 2)
+    re = re.reshape(blocks)
+    im = im.reshape(blocks)
+
+    rnd = lambda x: convround(x, iwidth + 1, owidth, shift)
+    rnd_sum_r = rnd(re[..., 0, :] + re[..., 1, :])
+    rnd_sum_i = rnd(im[..., 0, :] + im[..., 1, :])
+    rnd_diff_r = rnd(re[..., 0, :] - re[..., 1, :])
+    rnd_diff_i = rnd(im[..., 0, :] - im[..., 1, :])
+
+    out_r = np.empty(re.shape, dtype=np.int64)
+    out_i = np.empty(im.shape, dtype=np.int64)
+    out_r[..., 0, :] = rnd_sum_r
+    out_i[..., 0, :] = rnd_sum_i
+    out_r[..., 1, 0] = rnd_diff_r[..., 0]
+    out_i[..., 1, 0] = rnd_diff_i[..., 0]
+    out_r[..., 1, 1] = rnd_diff_i[..., 1]  # multiply by -j
+    out_i[..., 1, 1] = wrap(-rnd_diff_r[..., 1], owidth)
+    return unblock(out_r, 3), unblock(out_i, 3)
+
+def last_stage(re, im, iwidth, owidth, shift):
+    '''Model of laststage.v, a span 1 butterfly.'''
+    blocks = re.shape[:-1] + (-1, 2)
+    re = re.reshape(blocks)
+    im = im.reshape(blocks)
+
+    out_r = np.empty(re.shape, dtype=np.int64)
+    out_i = np.empty(im.shape, dtype=np.int64)
+    rnd = lambda x: convround(x, iwidth + 1, owidth, shift)
+    out_r[..., 0] = rnd(re[..., 0] + re[..., 1])
+    out_i[..., 0] = rnd(im[..., 0] + im[..., 1])
+    out_r[..., 1] = rnd(re[..., 0] - re[..., 1])
+    out_i[..., 1] = rnd(im[..., 0] - im[..., 1])
+    return unblock(out_r, 2), unblock(out_i, 2)
+
+@functools.lru_cache(maxsize=None)
+def bit_reverse_order(lg_len=LG_FFT_LEN):
+    '''Indices putting bit reversed outputs into natural order.'''
+    order = np.zeros(1 << lg_len, dtype=np.int64)
+    for k in range(lg_len):
+        order |= ((np.arange(1 << lg_len) >> k) & 1) << (lg_len - 1 - k)
+    order.setflags(write=False)
+    return order
+
+def fft(re, im=None):
+    '''Model of fftmain over frames of 256 samples along the last axis.
+
+    re and im are the 16b real and imaginary inputs, im is 0 if None. Returns
+    the 21b real and imaginary outputs in natural order as int64 arrays. The
+    RTL scales the result of a full precision FFT down by 8.
+    '''
+    re = np.asarray(re).astype(np.int64)
+    im = np.zeros_like(re) if im is None else np.asarray(im).astype(np.int64)
+    assert re.shape[-1] == FFT_LEN
+
+    for stage in BFLY_STAGES:
+        re, im = butterfly_stage(re, im, *stage)
+    re, im = qtr_stage(re, im, *QTR_STAGE)
+    re, im = last_stage(re, im, *LAST_STAGE)
+
+    order = bit_reverse_order()
+    return re[..., order], im[..., order]
+
+def rfft(x):
+    '''Model of fft_wrapper: the first 129 bins of the FFT of real frames,
+    as a complex array. A drop in replacement for np.fft.rfft(x) / 8.'''
+    re, im = fft(x)
+    n_bins = int(FFT_LEN / 2 + 1)
+    return re[..., :n_bins] + 1j * im[..., :n_bins]
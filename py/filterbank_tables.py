@@ -0,0 +1,116 @@
+'''Quantized mel filterbank tables for the ACO model and the RTL.
+
+The filterbank is constant for a given configuration, so the tables are built
+once per (num_filters, fft_length, fs) and shared. The arrays returned are
+read-only since they are cached.
+
+The RTL (rtl/aco/filterbank) stores the filterbank as two rows of
+coefficients, one for the even and one for the odd filters. Neighbouring
+triangular filters of the same parity do not overlap, so each row is the sum
+of its filters, and a boundary table holds the bin at which each filter ends.
+'''
+
+import functools
+import numpy as np
+import speechpy
+
+QUANT_SCALE = 2**16 - 1  # coefficients are quantized to uint16
+
+
+def read_only(x):
+    x.setflags(write=False)
+    return x
+
+@functools.lru_cache(maxsize=None)
+def get_filterbank(num_filters=32, fft_length=256, fs=16000):
+    '''Quantized filterbank of dims (num_filters, fft_length/2 + 1), uint16.'''
+    n_bins = int(fft_length / 2 + 1)
+    filterbank = speechpy.feature.filterbanks(num_filters, fft_length, fs)
+    filterbank = filterbank[:, :n_bins]
+    return read_only((filterbank * QUANT_SCALE).astype(np.uint16))
+
+def get_boundaries(x, n_bounds):
+    '''Get boundary indices between non-overlapping triangular windows.
+
+    The indices are int64 so that any fft_length works, the RTL stores them
+    in 8 bits, see to_hex_boundaries.
+    '''
+    bounds = np.zeros(n_bounds, dtype=np.int64)
+    bi = 0
+    wait_nonzero = True
+    for i in range(len(x)):
+        if wait_nonzero and x[i] == 0:  # skip leading zeros
+            continue
+        elif wait_nonzero:
+            wait_nonzero = False
+        if x[i] == 0:  # accumulate indices that are zero
+            bounds[bi] = i
+            bi += 1
+            wait_nonzero = True  # wait for the next nonzero data before
+                                 # considering a new boundary index
+    return bounds
+
+@functools.lru_cache(maxsize=None)
+def get_even_odd_tables(num_filters=32, fft_length=256, fs=16000):
+    '''Coefficient and boundary tables of the RTL filterbank.
+
+    Returns even_coef, odd_coef, even_boundary, odd_boundary, as written to
+    the coef_even, coef_odd, boundary_even and boundary_odd hex files.
+    '''
+    n_bins = int(fft_length / 2 + 1)
+    filterbank = speechpy.feature.filterbanks(num_filters, fft_length, fs)
+    filterbank = filterbank[:, :n_bins]
+    even_coef = filterbank[0::2, :].sum(axis=0)
+    odd_coef = filterbank[1::2, :].sum(axis=0)
+    # filters 0, 2, ... are even, an odd num_filters has one more of them
+    even_boundary = get_boundaries(even_coef, (num_filters + 1) // 2)
+    odd_boundary = get_boundaries(odd_coef, num_filters // 2)
+    even_coef = (even_coef * QUANT_SCALE).astype(np.uint16)  # scale up
+    odd_coef = (odd_coef * QUANT_SCALE).astype(np.uint16)
+    return (read_only(even_coef), read_only(odd_coef),
+            read_only(even_boundary), read_only(odd_boundary))
+
+def to_hex_boundaries(boundary):
+    '''A boundary table narrowed to the 8 bit entries of the RTL hex files,
+    which only hold the bins of an fft_length of up to 510.'''
+    assert boundary.max(initial=0) <= np.iinfo(np.uint8).max, \
+           'boundary bins do not fit the 8 bit RTL table'
+    return boundary.astype(np.uint8)
+
+@functools.lru_cache(maxsize=None)
+def get_filterbank_spans(num_filters=32, fft_length=256, fs=16000):
+    '''Sparse form of the quantized filterbank, walked like the RTL.
+
+    Returns coefs of dims (2, fft_length/2 + 1), the even and odd coefficient
+    rows, and starts, a pair of the first bins of the spans of the even and
+    of the odd filters, of (num_filters + 1) // 2 and num_filters // 2
+    entries. Filter 2m spans bins starts[0][m] up to the next start (or the
+    end of the row), and filter 2m+1 likewise in the odd row, so each filter
+    only accumulates its own nonzero bins.
+    '''
+    even_coef, odd_coef, even_boundary, odd_boundary = \
+        get_even_odd_tables(num_filters, fft_length, fs)
+    coefs = np.stack((even_coef, odd_coef)).astype(np.int64)
+    starts = []
+    for boundary in (even_boundary, odd_boundary):
+        # each span starts at the previous filter's zero boundary bin
+        parity_starts = np.zeros(len(boundary), dtype=np.int64)
+        parity_starts[1:] = boundary[:-1]
+        starts.append(read_only(parity_starts))
+    check_spans(get_filterbank(num_filters, fft_length, fs), starts)
+    return read_only(coefs), tuple(starts)
+
+def check_spans(filterbank, starts):
+    '''Raise a ValueError unless the nonzero bins of every filter lie in its
+    span, which fails when neighbouring filters of the same parity overlap,
+    e.g. for many filters over a short FFT.'''
+    n_bins = filterbank.shape[1]
+    for i in range(filterbank.shape[0]):
+        parity_starts = starts[i % 2]
+        m = i // 2
+        stop = parity_starts[m+1] if m + 1 < len(parity_starts) else n_bins
+        nonzero = np.flatnonzero(filterbank[i])
+        if len(nonzero) and (nonzero.min() < parity_starts[m] or nonzero.max() >= stop):
+            raise ValueError('filter {} of {} is not within its span, the '
+                             'filterbank can not be applied by spans'.format(
+                                 i, filterbank.shape[0]))
@@ -0,0 +1,129 @@
+'''Cache of golden vectors for the cocotb testbenches.
+
+The benches check the RTL against the software models run on the same
+inputs: the PCM input, every intermediate signal of aco.aco, and the conv
+outputs and logits of the network. These vectors are stored in one compressed
+.npz per input, keyed by a hash of the input (a file or an array), the
+function preparing the PCM from it, the version of the models (their source
+and the FFT twiddle tables) and the network parameters. Benches load the
+vectors when present and only run the models on a miss.
+'''
+
+import os
+import sys
+import hashlib
+import pathlib
+import functools
+import numpy as np
+
+import pdm
+import aco
+import fft_model
+import filterbank_tables
+import numpy_arch as na
+
+CACHE_DIR = pathlib.Path(__file__).parent.absolute() / 'golden_cache'
+FORMAT_VERSION = 1  # bump when the layout of the stored vectors changes
+N_SIGS = 9  # intermediate signals returned by aco.aco
+
+
+def file_hash(fname):
+    '''SHA-1 hex digest of the contents of a file.'''
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def array_hash(x):
+    '''SHA-1 hex digest of the dtype, shape and contents of an array.'''
+    x = np.ascontiguousarray(x)
+    h = hashlib.sha1('{}{}'.format(x.dtype.str, x.shape).encode())
+    h.update(x.tobytes())
+    return h.hexdigest()
+
+def source_hash(source):
+    '''Hash of a test input, either a file name or an array.'''
+    if source is None:
+        return ''
+    if isinstance(source, np.ndarray):
+        return array_hash(source)
+    return file_hash(source)
+
+def function_hash(fn):
+    '''Hash of a function by name and the source of its module.'''
+    h = hashlib.sha1('{}.{}'.format(fn.__module__, fn.__qualname__).encode())
+    module_fname = getattr(sys.modules[fn.__module__], '__file__', None)
+    if module_fname is not None:
+        h.update(file_hash(module_fname).encode())
+    return h.hexdigest()
+
+def params_hash(params):
+    '''Hash of the network parameters returned by na.get_params.'''
+    return hashlib.sha1(''.join(array_hash(np.asarray(p))
+                                for p in params).encode()).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def model_version():
+    '''Hash of everything the golden vectors are computed from besides the
+    input and the network parameters.'''
+    fnames = [m.__file__ for m in (pdm, aco, fft_model, filterbank_tables, na)]
+    fnames += [fft_model.FFT_DIR / stage[-1] for stage in fft_model.BFLY_STAGES]
+    h = hashlib.sha1(str(FORMAT_VERSION).encode())
+    for fname in fnames:
+        h.update(file_hash(fname).encode())
+    return h.hexdigest()
+
+def compute_vectors(pcm, params):
+    '''Run the software models on a one second PCM input.'''
+    sigs = aco.aco(pcm)
+    features = sigs[-1].reshape((-1, 13))
+    logits, conv1, conv2 = na.get_numpy_pred_custom_params(
+        features, params, quantize_input=True)
+    vectors = {'pcm': np.asarray(pcm), 'logits': logits,
+               'conv1': conv1, 'conv2': conv2}
+    for i, sig in enumerate(sigs):
+        vectors['sig_{}'.format(i)] = sig
+    return vectors
+
+def save_vectors(fname, vectors):
+    '''Write the vectors, then rename so concurrent benches never read a
+    partial file.'''
+    tmp_fname = '{}.{}.tmp.npz'.format(fname, os.getpid())
+    np.savez_compressed(tmp_fname, **vectors)
+    os.replace(tmp_fname, fname)
+
+def load_vectors(fname):
+    with np.load(fname) as f:
+        return {k: f[k] for k in f.files}
+
+def get_vectors(source, to_pcm, params=None, cache_dir=CACHE_DIR):
+    '''Golden vectors of a test input, loaded from the cache when possible.
+
+    source: the input the test is generated from, a file name or an array,
+            or None if to_pcm takes no input
+    to_pcm: function returning the int8 PCM input of the DUT from source
+    params: network parameters, na.get_params() if None
+    cache_dir: where the vectors are stored, None to disable the cache
+
+    Returns a dict with the PCM input 'pcm', the list of aco.aco outputs
+    'sigs', the network outputs 'conv1' and 'conv2', the 'logits' and 'wake'.
+    '''
+    params = na.get_params() if params is None else params
+    def compute():
+        pcm = to_pcm() if source is None else to_pcm(source)
+        return compute_vectors(pcm, params)
+
+    if cache_dir is None:
+        vectors = compute()
+    else:
+        key = hashlib.sha1((source_hash(source) + function_hash(to_pcm) +
+                            model_version() + params_hash(params)).encode())
+        fname = pathlib.Path(cache_dir) / (key.hexdigest() + '.npz')
+        if os.path.exists(fname):
+            vectors = load_vectors(fname)
+        else:
+            vectors = compute()
+            os.makedirs(cache_dir, exist_ok=True)
+            save_vectors(fname, vectors)
+
+    vectors['sigs'] = [vectors.pop('sig_{}'.format(i)) for i in range(N_SIGS)]
+    vectors['wake'] = vectors['logits'][0] > vectors['logits'][1]
+    return vectors
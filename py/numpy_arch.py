@@ -6,32 +6,41 @@ https://colab.research.google.com/drive/11s4RKhQOqi4lxJz2K83RSuqHdArnLfA0
 """
 
 import numpy as np
-import requests
-import os
+import functools
 import pathlib
 
 import sys
 cache_dir = pathlib.Path(__file__).parent.absolute()
 sys.path.append(str(cache_dir))
-import features  # module for loading mfcc features
+# features (module for loading mfcc features) is imported on first use, since
+# it may need to download and featurize the dataset
 
 
 # Load quantized parameters
-
-weights_archive = np.load(cache_dir / 'parameters_quantized.npz')
-weights_list = [weights_archive['arr_{}'.format(i)] for i in range(len(weights_archive))]
-
-# for weights in weights_list:
-    # print(weights.shape)
-
-input_scale = weights_list[0]
-bitshifts = weights_list[1]
-conv1_weights = weights_list[2]
-conv1_biases = weights_list[3]
-conv2_weights = weights_list[4]
-conv2_biases = weights_list[5]
-fc1_weights = weights_list[6]
-fc1_biases = weights_list[7]
+# The archive is read on first use, so importing this module for its helpers
+# does no disk work. The parameters are also available as module attributes,
+# e.g. numpy_arch.conv1_weights.
+
+param_names = ['input_scale', 'bitshifts',
+               'conv1_weights', 'conv1_biases',
+               'conv2_weights', 'conv2_biases',
+               'fc1_weights', 'fc1_biases']
+
+@functools.lru_cache(maxsize=None)
+def load_weights(fname='parameters_quantized.npz'):
+    '''Return a dict of the quantized parameters in a numpy archive.'''
+    weights_archive = np.load(cache_dir / fname)
+    weights_list = [weights_archive['arr_{}'.format(i)] for i in range(len(weights_archive))]
+    return dict(zip(param_names, weights_list))
+
+def get_input_scale():
+    return load_weights()['input_scale']
+
+def __getattr__(name):
+    '''Lazily load the quantized parameters on first attribute access.'''
+    if name in param_names:
+        return load_weights()[name]
+    raise AttributeError('module {} has no attribute {}'.format(__name__, name))
 
 # fc1_weights = fc1_weights.reshape(13, 16, 2).transpose((1,0,2)).reshape(208, 2)
 
@@ -62,19 +71,105 @@ def conv1d_multi_kernel(x, weights, biases):
     return out
 
 def max_pool_1d(x):
-    out = np.zeros((int(np.ceil(x.shape[0] / 2)), x.shape[1]), dtype=np.int8)
-    for j in range(x.shape[1]):
-        for i in range(int(np.floor(x.shape[0] / 2))):
-            out[i, j] = np.maximum(x[2*i, j], x[2*i+1, j])
-        if (x.shape[0] % 2 == 1):
-            out[-1, j] = x[-1, j]
+    '''Max pool featuremaps of dims (..., time, n_channels) by 2 along time.
+
+    Pairs of frames are reduced over a (..., time // 2, 2, n_channels) view
+    of x, and the last frame of an odd length is passed through.
+    '''
+    n_frames, n_channels = x.shape[-2:]
+    n_pairs = n_frames // 2
+    out = np.empty(x.shape[:-2] + ((n_frames + 1) // 2, n_channels), dtype=np.int8)
+    pairs = x[..., :2*n_pairs, :].reshape(x.shape[:-2] + (n_pairs, 2, n_channels))
+    np.max(pairs, axis=-2, out=out[..., :n_pairs, :])
+    if (n_frames % 2 == 1):
+        out[..., -1, :] = x[..., -1, :]
     return out
 
+# Batched numpy NN model
+# Featuremaps are stacked along a leading batch axis, so (N, time, n_coeffs)
+
+def conv_kernels(weights):
+    '''The weights of a conv layer as an int64 matrix of dims
+    (n_channels * filter_width, n_filters), matching the im2col windows.'''
+    filter_width, n_channels, n_kernels = weights.shape
+    kernels = weights.astype(np.int64).transpose((1, 0, 2))
+    return kernels.reshape((n_channels * filter_width, n_kernels))
+
+def conv1d_batch(x, weights, biases):
+    '''Perform convolution of a batch of input feature maps with all filters.
+
+    x dims are (N, time, n_channels) and weights dims are
+    (filter_width, n_channels, n_filters). The zero padded input is unrolled
+    into sliding windows (im2col) so that every output position of every
+    kernel for every sample is computed with a single int64 matmul.
+    Bit-exact with conv1d_multi_kernel applied to each sample.
+    '''
+    n, n_frames, n_channels = x.shape
+    filter_width, _, n_kernels = weights.shape
+    pad = (filter_width - 1) // 2
+    x_pad = np.zeros((n, n_frames + filter_width - 1, n_channels), dtype=np.int64)
+    x_pad[:, pad:pad+n_frames, :] = x  # zero padding
+    # windows dims are (N, time, n_channels, filter_width)
+    windows = np.lib.stride_tricks.sliding_window_view(x_pad, filter_width, axis=1)
+    windows = windows.reshape((n, n_frames, n_channels * filter_width))
+    out = np.matmul(windows, conv_kernels(weights)) + biases
+    return relu(out)
+
+def fc_accumulator(x_dtype, weights):
+    '''The narrowest of int32 and int64 that holds every partial sum of the
+    fc layer for inputs of x_dtype.
+
+    A partial sum of output j is bounded by max|x| * sum_i |weights[i, j]|,
+    so int8 inputs and the 208 int8 weights of an output need at most
+    128 * 208 * 128 < 2**22. The bias is added afterwards in int64.
+    '''
+    if not (np.issubdtype(x_dtype, np.integer) and
+            np.issubdtype(weights.dtype, np.integer)):
+        return np.int64
+    info = np.iinfo(x_dtype)
+    x_max = max(-int(info.min), int(info.max))
+    w_max = int(np.abs(weights.astype(np.int64)).sum(axis=0).max(initial=0))
+    if x_max * w_max <= np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+def fc_batch(x, weights, biases):
+    '''A fully connected linear layer over a batch of featuremaps.
+
+    The whole batch is one (N, n_inputs) x (n_inputs, n_classes) product,
+    accumulated in the narrowest type that can't overflow, see
+    fc_accumulator. The outputs are int64.
+    '''
+    x = x.reshape((x.shape[0], -1))
+    acc = fc_accumulator(x.dtype, weights)
+    out = np.matmul(x.astype(acc), weights.astype(acc))
+    return out.astype(np.int64) + biases
+
+def get_conv_outputs_batch(x, params):
+    '''Run both conv layers over a batch of quantized featuremaps.
+
+    x is an int8 stack of featuremaps of dims (N, 50, 13). Returns the
+    conv1 and conv2 outputs for every sample, of dims (N, 50, 8) and
+    (N, 25, 16), matching get_numpy_pred_custom_params.
+    '''
+    c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = params
+
+    assert x.ndim == 3
+
+    # conv1
+    x = conv1d_batch(x, c1w, c1b)
+    conv1_out = scale_feature_map(x, c1s)
+    x = max_pool_1d(conv1_out)
+
+    # conv2
+    x = conv1d_batch(x, c2w, c2b)
+    conv2_out = scale_feature_map(x, c2s)
+
+    return conv1_out, conv2_out
+
 def fc(x, weights, biases):
     '''A fully connected linear layer.'''
-    x = x.flatten()
-    out = np.matmul(x, weights, dtype=np.int64) + biases
-    return out
+    return fc_batch(x.reshape((1, -1)), weights, biases)[0]
 
 def scale_feature_map(x, shift):
     '''Scale a featuremap to a byte range given the amount to right shift by.
@@ -102,7 +197,7 @@ def get_numpy_pred_custom_params(x, params, quantize_input=False):
 
     # condition input feature map
     if quantize_input:
-        x = np.clip(np.round(x * input_scale), -128, 127).astype(np.int8)
+        x = np.clip(np.round(x * get_input_scale()), -128, 127).astype(np.int8)
         x = x.reshape((int(x.size / 13), 13))
 
     # conv1
@@ -124,21 +219,175 @@ def get_numpy_pred_custom_params(x, params, quantize_input=False):
 
 def get_numpy_pred(x):
     '''Get the output for an unquantized MFCC featuremap.'''
-    params = [conv1_weights, conv1_biases, bitshifts[0],
-              conv2_weights, conv2_biases, bitshifts[1],
-              fc1_weights, fc1_biases]
+    params = get_params()
     return get_numpy_pred_custom_params(x, params, quantize_input=True)
 
+def quantize_featuremaps(x):
+    '''Quantize a batch of flattened MFCC featuremaps of dims (N, 650) to an
+    int8 stack of dims (N, 50, 13).'''
+    x = np.clip(np.round(x * get_input_scale()), -128, 127).astype(np.int8)
+    x = x.reshape((x.shape[0], int(x.shape[1] / 13), 13))
+    return x
+
+def get_numpy_pred_batch_custom_params(x, params, quantize_input=False):
+    '''Top level function for running batched inference with the numpy model.
+
+    x is an int8 stack of featuremaps of dims (N, 50, 13), or a batch of
+    flattened floating point MFCC featuremaps of dims (N, 650) if
+    quantize_input is set. Returns the logits, conv1 and conv2 outputs of
+    every sample, each matching get_numpy_pred_custom_params exactly.
+    '''
+    c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = params
+
+    if quantize_input:
+        x = quantize_featuremaps(x)
+
+    conv1_out, conv2_out = get_conv_outputs_batch(x, params)
+    x = max_pool_1d(conv2_out)
+
+    # fc1
+    x = fc_batch(x, fcw, fcb)
+
+    return x, conv1_out, conv2_out
+
+def get_numpy_pred_batch(x):
+    '''Get the outputs for a batch of MFCC featuremaps.
+
+    x is either a batch of unquantized MFCC featuremaps of dims (N, 650), such
+    as features.X, or an int8 stack of quantized featuremaps of dims
+    (N, 50, 13).
+    '''
+    params = get_params()
+    return get_numpy_pred_batch_custom_params(x, params,
+                                              quantize_input=(x.ndim == 2))
+
+def get_accuracy(x, y):
+    '''Return the fraction of samples in x classified as their label in y.
+
+    Labels follow the dataset convention of 1 for the wake word and 2
+    otherwise.
+    '''
+    logits = get_numpy_pred_batch(x)[0]
+    wake = (logits[:, 0] > logits[:, 1])
+    pred = np.where(wake, 1, 2)
+    return np.mean(pred == y)
+
+# Incremental numpy NN model
+# For a featuremap window sliding over a stream, e.g. wake_stream.WakeStream
+
+def conv1d_positions(x, weights, biases, positions, kernels=None):
+    '''Compute the conv1d_multi_kernel outputs of a featuremap at a subset of
+    output positions only, returning dims (len(positions), n_filters).
+
+    kernels is conv_kernels(weights), computed here if not given.
+    '''
+    filter_width, n_channels, n_kernels = weights.shape
+    if kernels is None:
+        kernels = conv_kernels(weights)
+    pad = (filter_width - 1) // 2
+    x_pad = np.zeros((x.shape[0] + filter_width - 1, n_channels), dtype=np.int64)
+    x_pad[pad:pad+x.shape[0], :] = x  # zero padding
+    # windows dims are (len(positions), n_channels, filter_width), like conv1d_batch
+    windows = x_pad[positions[:, None] + np.arange(filter_width)].transpose((0, 2, 1))
+    windows = windows.reshape((len(positions), n_channels * filter_width))
+    return relu(np.matmul(windows, kernels) + biases)
+
+class IncrementalPred:
+    '''Inference over a window sliding along a stream of featuremap frames.
+
+    Interior conv outputs only depend on the frames around them, so they are
+    cached by the absolute frame index they start at and reused as the window
+    slides. conv1 positions 1..48 are reused, as are conv2 positions 2..22
+    once their max pool pairs realign (every even shift of the window). Only
+    the positions at the window edges and those covering new frames are
+    recomputed. The outputs are identical to get_numpy_pred_custom_params.
+
+    Frames must be the same every time a given absolute index is seen, call
+    reset() when starting a new stream.
+    '''
+
+    n_slots = 128  # cache entries, covering more than a window of frames
+
+    def __init__(self, params=None):
+        self.params = get_params() if params is None else params
+        self.conv1_kernels = conv_kernels(self.params[0])
+        self.conv2_kernels = conv_kernels(self.params[3])
+        self.reset()
+
+    def reset(self):
+        c1w, c2w = self.params[0], self.params[3]
+        # cached int8 conv outputs, stored in slot key % n_slots along with
+        # the absolute frame index key they start at (-1 when empty)
+        self.conv1_cache = np.zeros((self.n_slots, c1w.shape[2]), dtype=np.int8)
+        self.conv2_cache = np.zeros((self.n_slots, c2w.shape[2]), dtype=np.int8)
+        self.conv1_keys = np.full(self.n_slots, -1, dtype=np.int64)
+        self.conv2_keys = np.full(self.n_slots, -1, dtype=np.int64)
+
+    def cached_conv(self, x, weights, kernels, biases, shift, cache, cache_keys,
+                    start, stride, n_edge):
+        '''Scaled conv outputs of x, reusing cached positions.
+
+        Output position i starts at absolute frame start + stride*i, and is
+        only cached if it is at least n_edge positions away from the edges,
+        where it would depend on the zero padding.
+        '''
+        n_positions = x.shape[0]
+        interior = slice(n_edge, n_positions - n_edge)
+        keys = start + stride * np.arange(n_positions)
+        slots = keys % self.n_slots
+        hit = np.zeros(n_positions, dtype=bool)
+        hit[interior] = (cache_keys[slots[interior]] == keys[interior])
+        miss = np.flatnonzero(~hit)
+
+        out = np.empty((n_positions, weights.shape[2]), dtype=np.int8)
+        out[hit] = cache[slots[hit]]
+        out[miss] = scale_feature_map(conv1d_positions(x, weights, biases, miss, kernels),
+                                      shift)
+
+        # cache the newly computed interior outputs
+        new = miss[(miss >= n_edge) & (miss < n_positions - n_edge)]
+        cache[slots[new]] = out[new]
+        cache_keys[slots[new]] = keys[new]
+        return out
+
+    def pred(self, x, start):
+        '''Run inference on a quantized featuremap window.
+
+        x is an int8 featuremap of dims (50, 13), whose first frame is frame
+        number start of the stream. Returns the logits, conv1 and conv2
+        outputs like get_numpy_pred_custom_params.
+        '''
+        c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = self.params
+
+        # conv1
+        conv1_out = self.cached_conv(x, c1w, self.conv1_kernels, c1b, c1s,
+                                     self.conv1_cache, self.conv1_keys,
+                                     start, 1, 1)
+        x = max_pool_1d(conv1_out)
+
+        # conv2
+        conv2_out = self.cached_conv(x, c2w, self.conv2_kernels, c2b, c2s,
+                                     self.conv2_cache, self.conv2_keys,
+                                     start, 2, 2)
+        x = max_pool_1d(conv2_out)
+
+        # fc1
+        x = fc(x, fcw, fcb)
+
+        return x, conv1_out, conv2_out
+
 # Functions for external use in testbench
 # MFCC featurmaps returned are expected to be quantized already
 
 def get_num_train_samples():
-    return features.X.shape[0]
+    import features
+    return features.get_num_samples('train')
 
 def get_featuremap(index):
     '''Return the MFCC featuremap for a given index.'''
+    import features
     x = features.X[index,:]
-    x = np.clip(np.round(x * input_scale), -128, 127).astype(np.int8)
+    x = np.clip(np.round(x * get_input_scale()), -128, 127).astype(np.int8)
     x = x.reshape((int(x.size / 13), 13))
     return x
 
@@ -148,6 +397,7 @@ def get_random_featuremap():
 
 def get_numpy_pred_index(index):
     '''Run inference for training sample given its index.'''
+    import features
     return get_numpy_pred(features.X[index:index+1,:])
 
 def output_is_equal(y1, y2):
@@ -156,9 +406,10 @@ def output_is_equal(y1, y2):
 
 def get_params():
     '''Return the trained model weights for writing to dut memory.'''
-    params = [conv1_weights, conv1_biases, bitshifts[0],
-              conv2_weights, conv2_biases, bitshifts[1],
-              fc1_weights, fc1_biases]
+    w = load_weights()
+    params = [w['conv1_weights'], w['conv1_biases'], w['bitshifts'][0],
+              w['conv2_weights'], w['conv2_biases'], w['bitshifts'][1],
+              w['fc1_weights'], w['fc1_biases']]
     return params
 
 # ==============================================================================
@@ -293,17 +544,18 @@ def pretty_print_params():
     # params = [conv1_weights, conv1_biases, bitshifts[0],
               # conv2_weights, conv2_biases, bitshifts[1],
               # fc1_weights, fc1_biases]
+    c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = get_params()
     print("// Generated by numpy_arch")
-    pretty_print_conv_weights(1, conv1_weights)
-    pretty_print_conv_biases(1, conv1_biases)
-    pretty_print_conv_shift(1, bitshifts[0])
+    pretty_print_conv_weights(1, c1w)
+    pretty_print_conv_biases(1, c1b)
+    pretty_print_conv_shift(1, c1s)
 
-    pretty_print_conv_weights(2, conv2_weights)
-    pretty_print_conv_biases(2, conv2_biases)
-    pretty_print_conv_shift(2, bitshifts[1])
+    pretty_print_conv_weights(2, c2w)
+    pretty_print_conv_biases(2, c2b)
+    pretty_print_conv_shift(2, c2s)
 
-    pretty_print_fc_weights(fc1_weights)
-    pretty_print_fc_biases(fc1_biases)
+    pretty_print_fc_weights(fcw)
+    pretty_print_fc_biases(fcb)
 
 
 if __name__ == "__main__":
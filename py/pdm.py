@@ -68,18 +68,45 @@ def pcm_to_pdm_pwm(x):
 def pcm_to_pdm_err(x):
     '''From https://gist.github.com/jeanminet/2913ca7a87e96296b27e802575ad6153
     This is the most accurate PDM model.
-    '''
-    x = shift_zero_to_one(x)
-    x = np.repeat(x, ratio_in)
-    n = len(x)
-    y = np.zeros(n)
-    error = np.zeros(n+1)
-    for i in range(n):
+
+    x is a single clip, or a batch of clips of dims (N, n_samples).
+
+    The error feedback loop is
         y[i] = 1 if x[i] >= error[i] else 0
         error[i+1] = y[i] - x[i] + error[i]
-    # return y, error[0:n]
+    For 16b inputs every x[i] is a multiple of 2^-16 in [0, 1), so every
+    step of the loop is exact in float64 and error[i] is exactly the number
+    of ones in y[0..i-1] minus sum(x[0..i-1]). Solving the loop for the number
+    of ones in y[0..i] gives floor(sum(x[0..i])) + 1, which is computed for
+    all samples at once with an int64 cumsum. Inputs that do not satisfy this
+    fall back to running the loop.
+    '''
+    x = shift_zero_to_one(x)
+    q = x * 2**16  # integer valued for 16b inputs
+    if not (np.array_equal(q, np.round(q)) and q.min() >= 0 and q.max() < 2**16):
+        if x.ndim == 1:
+            return pcm_to_pdm_err_loop(x)
+        return np.array([pcm_to_pdm_err_loop(xi) for xi in x])
+
+    q = np.repeat(q.astype(np.int64), ratio_in, axis=-1)
+    ones = np.cumsum(q, axis=-1) // 2**16 + 1  # ones in y[0..i]
+    y = np.zeros(q.shape)
+    y[..., 0] = 1
+    y[..., 1:] = np.diff(ones, axis=-1)
     return y
 
+def pcm_to_pdm_err_loop(x):
+    '''Reference error feedback loop of pcm_to_pdm_err for a clip already
+    shifted to the range 0-1. Python floats are used as they follow the same
+    IEEE float64 arithmetic as numpy with far less overhead per sample.'''
+    x = np.repeat(x, ratio_in).tolist()
+    y = [0.0] * len(x)
+    error = 0.0
+    for i, xi in enumerate(x):
+        y[i] = 1.0 if xi >= error else 0.0
+        error = y[i] - xi + error
+    return np.array(y)
+
 
 def pcm_to_pdm(x, pdm_gen='err'):
     '''Generate the PDM signal for the sample.'''
@@ -126,6 +153,137 @@ def pdm_to_pcm(x, n_cic=1):
     x[0] = 0
     return x
 
+class CicDecimator:
+    '''Streaming model of the two stage CIC decimator of pdm_to_pcm.
+
+    PDM bits are consumed in chunks of any size with process(). The state of
+    each stage (the last ratio_out inputs, which are the comb delay line) is
+    carried across calls, so memory use is independent of the length of the
+    recording. The concatenated outputs match pdm_to_pcm(x, 2) bit-for-bit.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n_consumed = 0  # number of PDM samples consumed so far
+        self.cic1_history = np.zeros(ratio_out, dtype=np.int64)
+        self.cicn_history = np.zeros(ratio_out, dtype=np.int64)
+
+    @staticmethod
+    def moving_sum(history, x):
+        '''Sum over the last ratio_out samples for each sample of x, given the
+        ratio_out samples before it. Returns the sums and the new history.'''
+        x = np.concatenate((history, x))
+        integrated = np.cumsum(x)
+        return integrated[ratio_out:] - integrated[:-ratio_out], x[-ratio_out:]
+
+    def process(self, x):
+        '''Consume a chunk of PDM bits, returning the int8 PCM samples it
+        completes.'''
+        x = np.asarray(x).astype(np.int64)
+        n = len(x)
+
+        # cic1
+        x, self.cic1_history = self.moving_sum(self.cic1_history, x)
+        x = x - int(ratio_out/2)
+        x = x.astype(np.int8)
+
+        # cicn
+        x, self.cicn_history = self.moving_sum(self.cicn_history,
+                                               x.astype(np.int64))
+        x = x.astype(np.int16)
+        x = np.right_shift(x, 5)
+        x = np.clip(x, -128, 127).astype(np.int8)
+
+        # decimate, keeping every ratio_out'th sample of the whole stream
+        first = -self.n_consumed % ratio_out
+        y = x[first::ratio_out]
+        if self.n_consumed == 0 and n > 0:
+            y[0] = 0
+        self.n_consumed += n
+        return y
+
+def pdm_to_pcm_stream(chunks):
+    '''Decimate an iterable of PDM chunks, yielding int8 PCM chunks.'''
+    decimator = CicDecimator()
+    for chunk in chunks:
+        y = decimator.process(chunk)
+        if len(y) > 0:
+            yield y
+
+# =========== Bit-packed PDM ============
+# PDM is kept packed 8 bits per byte in little bit order, as captured from the
+# microphone, so one second of audio takes 500kB instead of 4M array entries.
+
+def pack_pdm(x):
+    '''Pack an array of PDM bits into bytes.'''
+    return np.packbits(np.asarray(x).astype(np.uint8), bitorder='little')
+
+def unpack_pdm(x_packed, n_bits=None):
+    '''Unpack bytes into an array of PDM bits.'''
+    return np.unpackbits(x_packed, count=n_bits, bitorder='little')
+
+# ones among the lowest r bits of a byte, and the sum of their bit positions
+partial_popcount = np.zeros((256, 9), dtype=np.int64)
+partial_positions = np.zeros((256, 9), dtype=np.int64)
+for r in range(1, 9):
+    bit = (np.arange(256) >> (r - 1)) & 1
+    partial_popcount[:, r] = partial_popcount[:, r - 1] + bit
+    partial_positions[:, r] = partial_positions[:, r - 1] + bit * (r - 1)
+
+def packed_prefix_sums(x_packed, k):
+    '''For each bit position in k, return the number of ones at positions
+    before it, and the sum of those positions.
+
+    Only per-byte running sums are accumulated, positions within a byte are
+    resolved with table lookups.
+    '''
+    x_packed = np.append(x_packed, np.uint8(0))  # allow k up to the total bits
+    byte_idx = np.arange(len(x_packed), dtype=np.int64)
+    counts = partial_popcount[x_packed, 8]
+    positions = partial_positions[x_packed, 8] + 8 * byte_idx * counts
+    counts_before = np.cumsum(counts) - counts
+    positions_before = np.cumsum(positions) - positions
+
+    byte, bit = k // 8, k % 8
+    value = x_packed[byte]
+    ones = counts_before[byte] + partial_popcount[value, bit]
+    ones_positions = (positions_before[byte] + 8 * byte * partial_popcount[value, bit] +
+                      partial_positions[value, bit])
+    return ones, ones_positions
+
+def pdm_to_pcm_packed(x_packed, n_bits=None):
+    '''Bit-packed equivalent of pdm_to_pcm(x, 2), matching it bit-for-bit.
+
+    The decimated output only depends on the cicn sum at every ratio_out'th
+    sample n, which is a sum of integrator (cic1) values
+        sum(cic1[j] for j in n-ratio_out+1..n)
+    where each cic1[j] is a popcount over the ratio_out bits ending at j.
+    With P[k] the number of ones before bit k, that is a sum of differences of
+    P, and sums of P are found from P and the sum of the positions of the ones.
+    Neither stage is evaluated at the full PDM rate.
+    '''
+    if n_bits is None:
+        n_bits = 8 * len(x_packed)
+    n_out = int(np.ceil(n_bits / ratio_out))
+    n = ratio_out * np.arange(1, n_out, dtype=np.int64)
+
+    # S[m] = P[0] + ... + P[m-1], evaluated at the three points needed per output
+    m = np.concatenate((n + 2, n - ratio_out + 2,
+                        np.maximum(n - 2 * ratio_out + 2, 0)))
+    m = np.maximum(m, 1)  # S[0] = S[1] = 0
+    ones, ones_positions = packed_prefix_sums(x_packed, m - 1)
+    s = (m - 1) * ones - ones_positions
+    s_end, s_mid, s_start = np.split(s, 3)
+
+    # cicn sum of cic1 outputs, including the cic1 offset of each term
+    x = (s_end - 2 * s_mid + s_start) - ratio_out * int(ratio_out/2)
+    x = x.astype(np.int16)
+    x = np.right_shift(x, 5)
+    x = np.clip(x, -128, 127).astype(np.int8)
+    return np.concatenate((np.zeros(1, dtype=np.int8), x))
+
 # =========== Plotting ============
 
 def get_power_spectrum(x):
@@ -0,0 +1,81 @@
+'''Streaming wake word detection over continuous PCM.
+
+The detector keeps a ring buffer of the last 50 MFCC frames (one second of
+audio). As PCM arrives, only the new 20 ms frames are featurized with
+aco.AcoStream. The window is rescored every hop
+frames, reusing the conv activations of the previous windows via
+numpy_arch.IncrementalPred. Words are detected regardless of where they fall
+relative to the chunks PCM arrives in.
+
+Frames are featurized once as part of the stream, so the preemphasis of the
+first frame of a window sees the sample before the window. The window scored
+is identical to running aco.aco on the last 16000 samples of the stream with
+prev_sample set to the sample preceding them (0 at the start of the stream),
+not to a standalone aco.aco of those samples, whose first frame starts from
+prev_sample=0 as a recording does.
+'''
+
+import numpy as np
+
+import aco
+import numpy_arch as na
+
+N_FRAMES = 50        # frames in the window scored by the network
+N_COEFS = 13         # MFCC coefficients per frame
+
+
+class WakeStream:
+    '''Streaming wake word detector.
+
+    hop: number of new frames between scoring the window, 1 to score every
+         20 ms
+    '''
+
+    def __init__(self, hop=1, params=None):
+        self.hop = hop
+        self.params = na.get_params() if params is None else params
+        self.model = na.IncrementalPred(self.params)
+        self.featurizer = aco.AcoStream()
+        self.reset()
+
+    def reset(self):
+        '''Clear the window and the stream state.'''
+        self.ring = np.zeros((N_FRAMES, N_COEFS), dtype=np.int8)
+        self.head = 0  # index in ring of the oldest frame
+        self.n_frames = 0  # frames featurized since reset
+        self.featurizer.reset()
+        self.model.reset()
+
+    def push_frame(self, frame):
+        '''Add the (13,) features of one frame to the ring buffer.'''
+        self.ring[self.head] = frame
+        self.head = (self.head + 1) % N_FRAMES
+        self.n_frames += 1
+
+    def window(self):
+        '''Return the featuremap of the last 50 frames, oldest first.'''
+        return np.concatenate((self.ring[self.head:], self.ring[:self.head]))
+
+    def score(self):
+        '''Run the network on the current window, returning the logits. The
+        first frame of the window is featurized following the frame before it
+        in the stream, see the module docstring.'''
+        x = self.window().reshape((1, N_FRAMES * N_COEFS))
+        x = na.quantize_featuremaps(x)[0]
+        return self.model.pred(x, self.n_frames - N_FRAMES)[0]
+
+    def push(self, pcm):
+        '''Add a chunk of PCM of any length to the stream.
+
+        Returns a list of (n_frames, wake, logits), one for each time the
+        window was scored, where n_frames is the number of frames in the
+        stream up to the end of the window.
+        '''
+        results = []
+        for frame in self.featurizer.push(pcm):
+            self.push_frame(frame)
+            n_scored = self.n_frames - N_FRAMES
+            if n_scored >= 0 and n_scored % self.hop == 0:
+                logits = self.score()
+                results.append((self.n_frames, logits[0] > logits[1], logits))
+        return results
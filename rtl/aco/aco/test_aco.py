@@ -15,6 +15,8 @@ import sys
 sys.path.append('../../../py/')
 import aco
 import pdm
+import golden_vectors
+import bus
 
 # Fixed parameters:
 N_FRAMES = 50  # frames 
@@ -24,35 +26,42 @@ N_MFE = 32
 N_DCT = 13
 
 # Configurable parameters:
-PCM_SPACING = 3  # cycles between writing another PCM input
-                 # must be >= 3 so the FFT isn't over utilised
-# PCM_SPACING = 250  # 250 is the final value but sim takes longer
+# cycles between writing another PCM input, must be >= 3 so the FFT isn't
+# over utilised; 250 is the final value but sim takes longer
+PCM_SPACING = int(cocotb.plusargs.get('pcm_spacing', 3))
+N_TESTS = int(cocotb.plusargs.get('n_tests', 12))  # tests run by main
+# check the FFT against fft_model exactly in a single pass, rather than within
+# a threshold and then again with the DUT FFT output fed to the model, once
+# the fft and fft_wrapper benches show the model is bit-accurate
+FFT_EXACT = bool(int(cocotb.plusargs.get('fft_exact', 0)))
 
 def get_msg(block, i, received, expected):
     return '{}: idx {}, dut output of {}, expected {}.'.format(
                     block, i, received, expected)
 
+def sample_to_pcm(fname):
+    x = pdm.read_sample_file(fname)
+    return aco.pdm_model(x, 'fast')
+
 def get_sample_test_vector():
     '''Get a real audio sample for input and calculate the expected outputs.'''
-    x = pdm.read_sample_file(pdm.SAMPLE_FNAME)
-    x_distorted = aco.pdm_model(x, 'fast')
-    sigs = aco.aco(x_distorted)
-    return x_distorted, sigs
+    v = golden_vectors.get_vectors(str(pdm.SAMPLE_FNAME), sample_to_pcm)
+    return v['pcm'], v['sigs']
 
-def get_cosine_test_vector():
-    '''Get a max amplitude cosine test vector to try saturate the pipeline
-    with.'''
+def cosine_pcm():
     t = np.linspace(0, 1, 16000)
     f = 20  # Hz
     A = 2**15-1  # max 16b signed amplitude
     x = A * np.cos(2*np.pi * f * t)
-    x = aco.pdm_model(x, 'fast')
-    sigs = aco.aco(x)
-    return x, sigs
+    return aco.pdm_model(x, 'fast')
 
-def get_multi_cosine_test_vector():
+def get_cosine_test_vector():
     '''Get a max amplitude cosine test vector to try saturate the pipeline
     with.'''
+    v = golden_vectors.get_vectors(None, cosine_pcm)
+    return v['pcm'], v['sigs']
+
+def multi_cosine_pcm():
     t = np.linspace(0, 1, 16000)
     n_freqs = 100
     freqs = np.logspace(0, np.log10(16000), 10)
@@ -60,15 +69,22 @@ def get_multi_cosine_test_vector():
     x = np.zeros(16000)
     for f in freqs:
         x += A * np.cos(2*np.pi * f * t)
-    x = aco.pdm_model(x, 'fast')
-    sigs = aco.aco(x)
-    return x, sigs
+    return aco.pdm_model(x, 'fast')
+
+def get_multi_cosine_test_vector():
+    '''Get a max amplitude cosine test vector to try saturate the pipeline
+    with.'''
+    v = golden_vectors.get_vectors(None, multi_cosine_pcm)
+    return v['pcm'], v['sigs']
+
+def random_to_pcm(x):
+    return aco.pdm_model(x, 'fast')
 
 def get_random_test_vector():
     x = np.random.randint(-2**15, 2**15-1, size=16000)
-    x = aco.pdm_model(x, 'fast')
-    sigs = aco.aco(x)
-    return x, sigs
+    # a fresh input every run, caching it would only grow the cache
+    v = golden_vectors.get_vectors(x, random_to_pcm, cache_dir=None)
+    return v['pcm'], v['sigs']
 
 def get_random_sample_test_vector(test_num):
     top_dir = '../../../py/'
@@ -80,10 +96,8 @@ def get_random_sample_test_vector(test_num):
     fname = sample_dir + fnames[idx]
     print('Running test with', fname)
     
-    x = pdm.read_sample_file(fname)
-    x = aco.pdm_model(x, 'fast')
-    sigs = aco.aco(x)
-    return x, sigs
+    v = golden_vectors.get_vectors(fname, sample_to_pcm)
+    return v['pcm'], v['sigs']
 
 async def write_input(dut, x):
     '''Write the PCM input to the dut.'''
@@ -128,7 +142,7 @@ async def check_framing(dut, y):
     print('FFT Framing: received expected output.')
 
 async def check_fft(dut, y, test_num):
-    threshold = 10  # maximum difference between expected and actual
+    threshold = 0 if FFT_EXACT else 10  # maximum difference between expected and actual
     full_sig = np.zeros((N_FRAMES, RFFT_LEN), dtype=np.cdouble)
     for i in range(N_FRAMES):
         while (dut.fft_valid_o != 1):  # wait until output is valid
@@ -136,9 +150,7 @@ async def check_fft(dut, y, test_num):
         sig = np.zeros(RFFT_LEN, dtype=np.cdouble)
         for j in range(RFFT_LEN):
             await Timer(1, units='us')
-            binstr = dut.fft_data_o.value.get_binstr()
-            split_binstr = [binstr[:21], binstr[21:]]
-            output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+            output_arr = bus.bv2np(dut.fft_data_o.value, n_bits=21)
             sig[j] = output_arr[0] + output_arr[1] * 1j
             if j == RFFT_LEN - 1:
                 assert dut.fft_last_o == 1
@@ -262,11 +274,8 @@ async def check_final(dut, y, test_num):
     for i in range(N_FRAMES):
         await Timer(1, units='us')
         assert dut.valid_o == 1
-        binstr = dut.data_o.value.get_binstr()
-        for j in range(N_DCT):
-            section = binstr[j*8 : (j+1)*8]
-            sig[i, j] = BinaryValue(section).signed_integer
-            assert sig[i, j] == y[i,j]
+        sig[i] = bus.bv2np(dut.data_o.value)
+        assert np.array_equal(sig[i], y[i])
         if i == N_FRAMES - 1:
             assert dut.last_o == 1
         else:
@@ -307,19 +316,21 @@ async def do_test(dut, test_num):
         x, y = get_random_test_vector()
     else:
         x, y = get_random_sample_test_vector(test_num)
+    if FFT_EXACT:  # the golden vectors use the float FFT
+        y = aco.aco(x, exact_fft=True)
     cocotb.fork(write_input(dut, x))
     cocotb.fork(check_preemphasis   (dut, y[0]))
     cocotb.fork(check_framing       (dut, y[1]))
-    fft_out = await check_fft       (dut, y[2], test_num)
-    # Take RTL FFT output and feed it to the ACO model to obtain the rest of the
-    # expected signals. This is because we don't have a bit-accurate model of
-    # the FFT.
-    y = aco.aco(x, fft_override=fft_out)
-    await reset(dut)  # reset to clear out previous values in pipeline
-    dut.en_i <= 1
-    cocotb.fork(write_input(dut, x))  # rewrite the input
-    cocotb.fork(check_preemphasis   (dut, y[0]))
-    cocotb.fork(check_framing       (dut, y[1]))
+    if not FFT_EXACT:
+        fft_out = await check_fft   (dut, y[2], test_num)
+        # Take RTL FFT output and feed it to the ACO model to obtain the rest
+        # of the expected signals, in case fft_model is not bit-accurate.
+        y = aco.aco(x, fft_override=fft_out)
+        await reset(dut)  # reset to clear out previous values in pipeline
+        dut.en_i <= 1
+        cocotb.fork(write_input(dut, x))  # rewrite the input
+        cocotb.fork(check_preemphasis(dut, y[0]))
+        cocotb.fork(check_framing   (dut, y[1]))
     cocotb.fork(check_fft           (dut, y[2], test_num))
     cocotb.fork(check_power_spectrum(dut, y[3], test_num))
     cocotb.fork(check_filterbank    (dut, y[4], test_num))
@@ -361,7 +372,7 @@ async def main(dut):
 
     await reset(dut)
 
-    for i in range(12):
+    for i in range(N_TESTS):
         await do_test(dut, i)
     # await do_test(dut, 1)
 
@@ -9,6 +9,11 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge, Timer
 from cocotb.binary import BinaryValue
 
+import sys
+sys.path.append('../../../py/')
+import bus
+import fft_model
+
 ENABLE_ASSERTS = True
 
 FFT_LEN = 256
@@ -20,6 +25,7 @@ max_deviation_percent = 10  # threshold to error at
 
 test_results = []
 expected_results = []
+model_results = []
 titles = []
 
 OKGREEN = '\033[92m'
@@ -72,15 +78,14 @@ async def write_input(dut, sig):
     dut.valid_i <= 0
     dut.data_i <= 1
     expected_results.append(np.fft.rfft(sig))
+    model_results.append(fft_model.rfft([int(s) for s in sig]))
 
 async def read_output_once(dut):
     while (dut.valid_o != 1):  # wait until output is valid
         await FallingEdge(dut.clk_i)
     sig = np.zeros(RFFT_LEN, dtype=np.cdouble)
     for i in range(RFFT_LEN):
-        binstr = dut.data_o.value.get_binstr()
-        split_binstr = [binstr[:21], binstr[21:]]
-        output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+        output_arr = bus.bv2np(dut.data_o.value, n_bits=21)
         sig[i] = output_arr[0] + output_arr[1] * 1j
         if i == RFFT_LEN - 1:
             assert dut.last_o == 1
@@ -122,6 +127,19 @@ def gen_result_plots():
             print(OKGREEN + titles[i],
                   'expected output within error threshold.', ENDC)
 
+def check_model_results():
+    '''Check the received results are identical to the fixed-point model.'''
+    for i in range(len(test_results)):
+        n_diff = np.count_nonzero(test_results[i] != model_results[i])
+        if n_diff:
+            max_diff = np.abs(test_results[i] - model_results[i]).max()
+            print(titles[i], 'output differs from fft_model in', n_diff,
+                  'bins, by up to', max_diff)
+            if ENABLE_ASSERTS:
+                raise Exception('Output differs from fft_model')
+        else:
+            print(OKGREEN + titles[i], 'output identical to fft_model.', ENDC)
+
 @cocotb.test()
 async def main(dut):
     # Create a 10us period clock on port clk
@@ -162,3 +180,4 @@ async def main(dut):
     await Timer(5001, units='us')
 
     gen_result_plots()
+    check_model_results()
@@ -5,12 +5,15 @@
 MFCC coefficient and boundary hex files.'''
 
 import numpy as np
-import speechpy
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge, Timer
 
+import sys
+sys.path.append('../../../py/')
+import filterbank_tables
+
 FRAME_LEN = 129
 NUM_COEF  = 32
 N_FRAMES  = 10
@@ -22,41 +25,12 @@ ODD_BOUNDARY_FNAME  = 'boundary_odd.hex'
 def get_msg(i, received, expected):
     return 'idx {}, dut output of {}, expected {}'.format(i, received, expected)
 
-def get_boundaries(x):
-    '''Get boundary indices between non-overlapping triangular windows.'''
-    bounds = np.zeros(int(NUM_COEF / 2), dtype=np.uint8)
-    bi = 0
-    first = True
-    wait_nonzero = True
-    for i in range(len(x)):
-        if wait_nonzero and x[i] == 0:  # skip leading zeros
-            continue
-        elif wait_nonzero:
-            wait_nonzero = False
-        if x[i] == 0:  # accumulate indices that are zero
-            bounds[bi] = i
-            bi += 1
-            wait_nonzero = True  # wait for the next nonzero data before
-                                 # considering a new boundary index
-    return bounds
-
 def get_filterbank():
     '''Generate deterministic filterbank coefficients and boundary indices.'''
-    filterbank = speechpy.feature.filterbanks(32, 256, 16000)[:,:FRAME_LEN]
-    even_coef = np.zeros(129)
-    odd_coef = np.zeros(129)
-    for i in range(0, NUM_COEF, 2):
-        even_coef += filterbank[i,:]
-    for i in range(1, NUM_COEF, 2):
-        odd_coef += filterbank[i,:]
-    even_boundary = get_boundaries(even_coef)
-    odd_boundary = get_boundaries(odd_coef)
+    even_coef, odd_coef, even_boundary, odd_boundary = \
+        filterbank_tables.get_even_odd_tables(NUM_COEF, 256, 16000)
     print('even bounds: ', even_boundary)
     print('odd bounds: ', odd_boundary)
-    even_coef = even_coef * (2**16 - 1)  # scale up
-    odd_coef = odd_coef * (2**16 - 1)
-    even_coef = even_coef.astype(np.uint16)
-    odd_coef = odd_coef.astype(np.uint16)
     return even_coef, odd_coef, even_boundary, odd_boundary
 
 def write_hex_file(fname, x, fmt):
@@ -71,13 +45,12 @@ def write_filterbank():
     bound_fmt = '{:02x}\n'
     write_hex_file(EVEN_COEF_FNAME, ecoef, coef_fmt)
     write_hex_file(ODD_COEF_FNAME, ocoef, coef_fmt)
-    write_hex_file(EVEN_BOUNDARY_FNAME, ebound, bound_fmt)
-    write_hex_file(ODD_BOUNDARY_FNAME, obound, bound_fmt)
+    write_hex_file(EVEN_BOUNDARY_FNAME, filterbank_tables.to_hex_boundaries(ebound), bound_fmt)
+    write_hex_file(ODD_BOUNDARY_FNAME, filterbank_tables.to_hex_boundaries(obound), bound_fmt)
 
 def get_expected_output(x):
     '''Calculate the expected output.'''
-    filterbank = speechpy.feature.filterbanks(32, 256, 16000)[:,:FRAME_LEN]
-    filterbank = (filterbank * (2**16 - 1)).astype(np.uint16)
+    filterbank = filterbank_tables.get_filterbank(NUM_COEF, 256, 16000)
     even = filterbank[::2,:]
     odd = filterbank[1::2,:]
     y = np.zeros(N_FRAMES * NUM_COEF)
@@ -8,23 +8,11 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge, Timer
 from cocotb.binary import BinaryValue
 
-FRAME_LEN = 13
-
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
+import sys
+sys.path.append('../../../py/')
+import bus
 
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
+FRAME_LEN = 13
 
 def get_msg(i, received, expected):
     return 'idx {}, dut output of {}, expected {}'.format(i, received, expected)
@@ -37,7 +25,7 @@ def get_test_vector():
     xr = x.reshape(10, FRAME_LEN)
     y = []
     for i in range(10):
-        y.append(np2bv(xr[i,:]))
+        y.append(bus.np2bv(xr[i,:]))
     return x, y
 
 async def write_input(dut, x, inter_frame_delay=0):
@@ -8,22 +8,9 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge, Timer
 from cocotb.binary import BinaryValue
 
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
+import sys
+sys.path.append('../../../py/')
+import bus
 
 def get_msg(i, received, expected):
     return 'idx {}, dut output of {}, expected {}'.format(i, received, expected)
@@ -40,7 +27,7 @@ def get_test_vector():
 async def write_input(dut, x, l):
     i = 0
     while i < len(x):
-        dut.data_i <= np2bv(np.array([int(x[i].real), int(x[i].imag)]), n_bits=21)
+        dut.data_i <= bus.np2bv(np.array([int(x[i].real), int(x[i].imag)]), n_bits=21)
         valid = np.random.randint(2)  # randomly de-assert valid
         # valid = 1
         dut.valid_i <= (1 if valid else 0)
@@ -7,6 +7,8 @@ Top Level Wakey-Wakey Testbench
 
 import sys
 sys.path.append('../../../py/')
+import bus
+import cfg_image
 
 import numpy as np
 import numpy_arch as na
@@ -32,26 +34,6 @@ INT32_MIN = np.iinfo(np.int32).min
 INT32_MAX = np.iinfo(np.int32).max
 
 
-# ==============================================================================
-# General Utilities
-# ==============================================================================
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
-
 # ==============================================================================
 # Wishbone Transactions
 # ==============================================================================
@@ -298,7 +280,7 @@ async def write_input_features(dut, x):
     await FallingEdge(dut.clk_i)
     dut.valid_i <= 1
     for i in range(n_frames):
-        dut.data_i <= np2bv(x[i,:])
+        dut.data_i <= bus.np2bv(x[i,:])
         if i == n_frames - 1:
             dut.last_i <= 1
         await FallingEdge(dut.clk_i)
@@ -365,9 +347,7 @@ async def read_fc_output(dut, expected):
     await FallingEdge(dut.clk_i)
     while (dut.wrd_inst.fc_valid != 1):  # wait until valid output
         await FallingEdge(dut.clk_i)
-    binstr = dut.wrd_inst.fc_data.value.get_binstr()
-    split_binstr = [binstr[32:], binstr[:32]]
-    output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+    output_arr = bus.bv2np(dut.wrd_inst.fc_data.value, n_bits=32)[::-1]  # class 0 is the low word
 
     if ENABLE_ASSERTS:
         for i in range(2):
@@ -479,6 +459,12 @@ def get_fixed_input2():
 # ==================== Writing generated inputs ====================
 
 async def write_mem_params(dut, p):
+    # +cfg_load=sequential|burst|backdoor, see py/cfg_image.py
+    mode = cocotb.plusargs.get('cfg_load', 'sequential')
+    if mode != 'sequential':
+        await cfg_image.load(dut, dut.wrd_inst, p, mode)
+        return
+
     c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = p
     await write_conv_mem(dut, 1, c1w, c1b, c1s)
     await write_conv_mem(dut, 2, c2w, c2b, c2s)
@@ -725,3 +711,87 @@ async def test_cfg(dut):
         params = na.get_params()
         await write_mem_params(dut, params)
         await do_mfcc_test(dut)
+
+
+async def read_back_params(dut, addrs):
+    """Read every CFG address with cfg_load, as ints"""
+    words = np.zeros((len(addrs), 4), dtype=np.int64)
+    for i, addr in enumerate(addrs):
+        observed = await cfg_load(dut, int(addr))
+        words[i] = [int(word) for word in observed]
+    return words
+
+
+@cocotb.test()
+async def test_cfg_image(dut):
+    """
+    Check the burst and backdoor loaders of py/cfg_image.py leave the same
+    memory contents as the sequential cfg_store loops, read back through
+    cfg_load, before the top level benches use them
+    """
+    # Create a 10us period clock on port clk
+    clock = Clock(dut.clk_i, 10, units="us")
+    cocotb.fork(clock.start())
+
+    # Reset DUT
+    await FallingEdge(dut.clk_i)
+    dut.rst_n_i <= 0
+    dut.wbs_stb_i <= 0
+    dut.wbs_cyc_i <= 0
+    dut.wbs_we_i <= 0
+    dut.wbs_sel_i <= 0
+    dut.wbs_dat_i <= 0
+    dut.wbs_adr_i <= 0
+    dut.data_i <= 0
+    dut.valid_i <= 0
+    dut.last_i <= 0
+
+    # wait long enough for reset to be effective
+    for _ in range(50):
+        await FallingEdge(dut.clk_i)
+    dut.rst_n_i <= 1
+    await FallingEdge(dut.clk_i)
+
+    c1w, c1b, c1s = get_random_conv_values(13, 8)
+    c2w, c2b, c2s = get_random_conv_values(8, 16)
+    fcw, fcb      = get_random_fc_values(208, 2)
+    params = [c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb]
+    zeros = [np.zeros_like(p) for p in params]
+    addrs, _ = cfg_image.get_cfg_stores(params)
+
+    print('=' * 100)
+    print('Reading back parameters loaded by sequential stores')
+    print('=' * 100)
+    c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = params
+    await write_conv_mem(dut, 1, c1w, c1b, c1s)
+    await write_conv_mem(dut, 2, c2w, c2b, c2s)
+    await write_fc_mem(dut, fcw, fcb)
+    expected = await read_back_params(dut, addrs)
+    assert expected.any(), 'Sequential stores read back as all zeros'
+
+    for mode in ['burst', 'backdoor']:
+        print('=' * 100)
+        print('Reading back parameters loaded by {}'.format(mode))
+        print('=' * 100)
+        # clear the memories so a load writing nothing is caught
+        z1w, z1b, z1s, z2w, z2b, z2s, zfw, zfb = zeros
+        await write_conv_mem(dut, 1, z1w, z1b, z1s)
+        await write_conv_mem(dut, 2, z2w, z2b, z2s)
+        await write_fc_mem(dut, zfw, zfb)
+
+        await cfg_image.load(dut, dut.wrd_inst, params, mode)
+        observed = await read_back_params(dut, addrs)
+        mismatches = np.flatnonzero((observed != expected).any(axis=1))
+        for i in mismatches:
+            print('Address 0x{:x}: read back {}, expected {}'.format(
+                  addrs[i], observed[i].tolist(), expected[i].tolist()))
+        assert len(mismatches) == 0, \
+               '{} load differs from sequential stores at {} addresses'.format(
+               mode, len(mismatches))
+        # the loaded parameters also give the model's outputs
+        input_features = get_random_input()
+        fc_exp, c1_exp, c2_exp = na.get_numpy_pred_custom_params(input_features, params)
+        await write_input_features(dut, input_features)
+        cocotb.fork(read_conv_output(dut, 1, 50, 8, c1_exp))
+        cocotb.fork(read_conv_output(dut, 2, 25, 16, c2_exp))
+        await read_fc_output(dut, fc_exp)
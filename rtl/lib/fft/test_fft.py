@@ -9,6 +9,11 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge
 from cocotb.binary import BinaryValue
 
+import sys
+sys.path.append('../../../py/')
+import bus
+import fft_model
+
 ENABLE_ASSERTS = True
 
 scale_factor = 8  # dut results are this factor smaller than the expected
@@ -17,27 +22,12 @@ max_deviation_percent = 10  # threshold to error at
 
 test_results = []
 expected_results = []
+model_results = []
 titles = []
 
 OKGREEN = '\033[92m'
 ENDC = '\033[0m'
 
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
 def constant_sig():
     titles.append('Constant input')
     return np.ones(256)
@@ -68,19 +58,19 @@ def multi_cosine_sig():
 async def write_input(dut, sig):
     '''Send inputs into the dut and save the expected output.'''
     for i in range(256):
-        bv = np2bv(np.array([int(sig[i]), 0]), n_bits=16)
+        bv = bus.np2bv(np.array([int(sig[i]), 0]), n_bits=16)
         dut.i_sample <= bv
         await FallingEdge(dut.i_clk)
     expected_results.append(np.fft.fft(sig))
+    re, im = fft_model.fft([int(s) for s in sig])
+    model_results.append(re + im * 1j)
 
 async def read_output_once(dut):
     while (dut.o_sync != 1):  # wait until sync indicates start of frame
         await FallingEdge(dut.i_clk)
     sig = np.zeros(256, dtype=np.cdouble)
     for i in range(256):
-        binstr = dut.o_result.value.get_binstr()
-        split_binstr = [binstr[:21], binstr[21:]]
-        output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+        output_arr = bus.bv2np(dut.o_result.value, n_bits=21)
         sig[i] = output_arr[0] + output_arr[1] * 1j
         await FallingEdge(dut.i_clk)
     test_results.append(sig)
@@ -124,6 +114,19 @@ def gen_result_plots():
             print(OKGREEN + titles[i],
                   'expected output within error threshold.', ENDC)
 
+def check_model_results():
+    '''Check the received results are identical to the fixed-point model.'''
+    for i in range(len(test_results)):
+        n_diff = np.count_nonzero(test_results[i] != model_results[i])
+        if n_diff:
+            max_diff = np.abs(test_results[i] - model_results[i]).max()
+            print(titles[i], 'output differs from fft_model in', n_diff,
+                  'bins, by up to', max_diff)
+            if ENABLE_ASSERTS:
+                raise Exception('Output differs from fft_model')
+        else:
+            print(OKGREEN + titles[i], 'output identical to fft_model.', ENDC)
+
 @cocotb.test()
 async def test_fft(dut):
     # Create a 10us period clock on port clk
@@ -151,3 +154,4 @@ async def test_fft(dut):
     await reader
 
     gen_result_plots()
+    check_model_results()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+'''Parallel regression of the cocotb testbenches under rtl/.
+
+Every rtl/<block>/<module>/Makefile including the cocotb makefiles is a
+bench. Each bench is run once per seed, and the (bench, seed) jobs are run by
+a pool of simulator processes. Every job runs in its own copy of the bench
+directory under the output directory, next to symlinks to the rest of the
+repository, so the relative paths of the bench resolve as usual while the
+files it writes (wave.vcd, plots, copied or generated .hex files) are private
+to the job. Its SIM_BUILD and COCOTB_RESULTS_FILE are there too, and it runs
+with RANDOM_SEED set to its seed. The bench module is run after
+seed_numpy.py, which seeds numpy with the same seed, so a failing job is
+reproduced by running it again with its seed.
+
+The results.xml of all jobs are merged into one, and the wall time of every
+test is reported. Jobs are started longest first using the wall times of the
+previous run.
+
+Run with, e.g.:
+    python3 regress.py -j 32 --seeds 8
+    python3 regress.py --bench aco/aco --base-seed 1234 --seeds 1
+'''
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import shutil
+import pathlib
+import subprocess
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+RTL_DIR = pathlib.Path(__file__).parent.absolute()
+REPO_DIR = RTL_DIR.parent
+OUT_DIR = RTL_DIR / 'regress_out'
+SEED_MODULE = 'seed_numpy'
+TIMES_FNAME = 'times.json'  # wall time of each job of the last run
+
+
+def find_benches(patterns=None):
+    '''Names, e.g. 'aco/aco', of the bench directories matching any of the
+    glob patterns, or all benches if None.'''
+    benches = []
+    for makefile in sorted(RTL_DIR.glob('*/*/Makefile')):
+        if 'cocotb-config' not in makefile.read_text():
+            continue
+        name = str(makefile.parent.relative_to(RTL_DIR))
+        if patterns is None or any(fnmatch.fnmatch(name, p) for p in patterns):
+            benches.append(name)
+    return benches
+
+def get_module(bench):
+    '''The MODULE of a bench's Makefile.'''
+    for line in (RTL_DIR / bench / 'Makefile').read_text().splitlines():
+        fields = line.split('#')[0].split()
+        if len(fields) >= 3 and fields[0] == 'MODULE' and fields[1] in ('=', '?=', ':='):
+            return fields[2]
+    raise ValueError('No MODULE in the Makefile of {}'.format(bench))
+
+def job_dir(out_dir, bench, seed):
+    return pathlib.Path(out_dir) / bench.replace('/', '_') / 'seed_{}'.format(seed)
+
+def make_cmd(bench, seed, args):
+    '''Environment and make command line of the job of bench with seed.'''
+    env = dict(os.environ)
+    env['RANDOM_SEED'] = str(seed)
+    env['PYTHONPATH'] = os.pathsep.join([str(RTL_DIR)] +
+        ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    cmd = ['make', 'MODULE={},{}'.format(SEED_MODULE, get_module(bench))]
+    if args.sim is not None:
+        cmd.append('SIM={}'.format(args.sim))
+    if args.testcase is not None:
+        cmd.append('TESTCASE={}'.format(args.testcase))
+    if args.plusargs:
+        cmd.append('PLUSARGS={}'.format(' '.join(args.plusargs)))
+    return env, cmd
+
+def repro_cmd(bench, seed, args):
+    '''Shell command rerunning a job by hand in its bench directory.'''
+    _, cmd = make_cmd(bench, seed, args)
+    cmd = ["'{}'".format(c) if ' ' in c else c for c in cmd]
+    return 'cd {} && PYTHONPATH={} RANDOM_SEED={} {}'.format(
+        RTL_DIR / bench, RTL_DIR, seed, ' '.join(cmd))
+
+def make_work_dir(bench, work, out_dir):
+    '''Mirror the repository under work for one job of bench, returning the
+    directory to run it in.
+
+    The bench directory is copied, without build products, waves or plots.
+    Every other entry on its path from the repository root is a symlink to
+    the original, so e.g. ../../lib/fifo/ and ../../../py/ still resolve.
+    '''
+    if work.exists():
+        shutil.rmtree(work)
+    src, dst = REPO_DIR, work
+    for part in pathlib.Path('rtl', bench).parts:
+        dst.mkdir(parents=True)
+        for entry in src.iterdir():
+            if entry.name != part and entry.resolve() != pathlib.Path(out_dir).resolve():
+                (dst / entry.name).symlink_to(entry)
+        src, dst = src / part, dst / part
+    shutil.copytree(src, dst, symlinks=True, ignore=shutil.ignore_patterns(
+        '__pycache__', 'sim_build', 'results.xml', '*.vcd', '*.png'))
+    return dst
+
+def run_job(bench, seed, args):
+    '''Run one bench with one seed, returning a summary of the job.'''
+    out = job_dir(args.out_dir, bench, seed)
+    out.mkdir(parents=True, exist_ok=True)
+    results_fname = out / 'results.xml'
+    if results_fname.exists():
+        results_fname.unlink()
+    cwd = make_work_dir(bench, out / 'work', args.out_dir)
+    env, cmd = make_cmd(bench, seed, args)
+    cmd += ['SIM_BUILD={}'.format(out / 'sim_build'),
+            'COCOTB_RESULTS_FILE={}'.format(results_fname)]
+
+    start = time.perf_counter()
+    with open(out / 'make.log', 'w') as log:
+        try:
+            returncode = subprocess.run(cmd, cwd=cwd, env=env,
+                                        stdout=log, stderr=subprocess.STDOUT,
+                                        timeout=args.timeout).returncode
+        except subprocess.TimeoutExpired:
+            returncode = None
+    return {'bench': bench, 'seed': seed, 'returncode': returncode,
+            'wall_time': time.perf_counter() - start,
+            'results': str(results_fname), 'log': str(out / 'make.log')}
+
+def parse_results(fname):
+    '''Test cases of a cocotb results.xml as a list of dicts.'''
+    tests = []
+    for case in ET.parse(fname).getroot().iter('testcase'):
+        if case.find('failure') is not None or case.find('error') is not None:
+            status = 'FAIL'
+        elif case.find('skipped') is not None:
+            status = 'SKIP'
+        else:
+            status = 'PASS'
+        tests.append({'name': case.get('name'), 'status': status,
+                      'wall_time': float(case.get('time', 0)),
+                      'sim_time_ns': float(case.get('sim_time_ns', 0)),
+                      'element': case})
+    return tests
+
+def collect(job):
+    '''Add the tests of a finished job to it, a single failing 'make' test if
+    the simulation did not write its results.'''
+    if job['returncode'] is not None and os.path.exists(job['results']):
+        job['tests'] = parse_results(job['results'])
+        return job
+
+    reason = 'timed out' if job['returncode'] is None else 'wrote no results'
+    case = ET.Element('testcase', name='make', time=str(job['wall_time']))
+    ET.SubElement(case, 'error', message='simulation {}, see {}'.format(
+        reason, job['log']))
+    job['tests'] = [{'name': 'make', 'status': 'FAIL',
+                     'wall_time': job['wall_time'], 'sim_time_ns': 0.0,
+                     'element': case}]
+    return job
+
+def write_merged_results(jobs, fname):
+    '''Merge the tests of all jobs into one JUnit XML file, one testsuite per
+    job.'''
+    root = ET.Element('testsuites', name='regress')
+    for job in jobs:
+        suite = ET.SubElement(root, 'testsuite',
+            name='{}[seed={}]'.format(job['bench'], job['seed']),
+            tests=str(len(job['tests'])),
+            failures=str(sum(t['status'] == 'FAIL' for t in job['tests'])),
+            time='{:.3f}'.format(job['wall_time']))
+        props = ET.SubElement(suite, 'properties')
+        ET.SubElement(props, 'property', name='random_seed', value=str(job['seed']))
+        for test in job['tests']:
+            case = test['element']
+            case.set('classname', job['bench'].replace('/', '.'))
+            suite.append(case)
+    ET.ElementTree(root).write(fname, encoding='utf-8', xml_declaration=True)
+
+def print_report(jobs, args, elapsed):
+    tests = [(job, t) for job in jobs for t in job['tests']]
+    print()
+    print('{:24} {:>12} {:40} {:>6} {:>10} {:>14}'.format(
+        'bench', 'seed', 'test', 'status', 'wall (s)', 'sim time (ns)'))
+    for job, t in sorted(tests, key=lambda x: -x[1]['wall_time']):
+        print('{:24} {:>12} {:40} {:>6} {:10.2f} {:14.0f}'.format(
+            job['bench'], job['seed'], t['name'], t['status'], t['wall_time'],
+            t['sim_time_ns']))
+
+    failed = [job for job in jobs
+              if any(t['status'] == 'FAIL' for t in job['tests'])]
+    n_fail = sum(t['status'] == 'FAIL' for _, t in tests)
+    print()
+    print('{} jobs, {} tests, {} failed, {:.1f} s of jobs in {:.1f} s'.format(
+        len(jobs), len(tests), n_fail, sum(j['wall_time'] for j in jobs), elapsed))
+    for job in failed:
+        print('FAILED {} seed {}, log {}'.format(job['bench'], job['seed'], job['log']))
+        print('    {}'.format(repro_cmd(job['bench'], job['seed'], args)))
+
+def load_times(out_dir):
+    try:
+        with open(pathlib.Path(out_dir) / TIMES_FNAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_times(out_dir, jobs):
+    times = load_times(out_dir)
+    latest = {}
+    for job in jobs:  # the slowest seed of each bench
+        latest[job['bench']] = max(job['wall_time'], latest.get(job['bench'], 0))
+    times.update(latest)
+    with open(pathlib.Path(out_dir) / TIMES_FNAME, 'w') as f:
+        json.dump(times, f, indent=1, sort_keys=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-b', '--bench', nargs='+', default=None,
+                        help='glob patterns of the benches to run, e.g. aco/* (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of simulator processes (default: number of cpus)')
+    parser.add_argument('-n', '--seeds', type=int, default=1,
+                        help='number of seeds to run each bench with')
+    parser.add_argument('-s', '--base-seed', type=int, default=None,
+                        help='seed of the first run of each bench, the others '
+                             'count up from it (default: the current time)')
+    parser.add_argument('--sim', default=None, help='simulator, passed as SIM')
+    parser.add_argument('--testcase', default=None, help='passed as TESTCASE')
+    parser.add_argument('--plusargs', nargs='+', default=[],
+                        help='simulator plusargs, e.g. +n_tests=2')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='wall time limit of each job in seconds')
+    parser.add_argument('-o', '--out-dir', default=OUT_DIR,
+                        help='where the builds, logs and results go')
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='only list the benches')
+    args = parser.parse_args()
+
+    benches = find_benches(args.bench)
+    if args.list or len(benches) == 0:
+        print('\n'.join(benches) if benches else 'No benches match.')
+        return 0 if benches else 1
+
+    base_seed = int(time.time()) if args.base_seed is None else args.base_seed
+    seeds = [base_seed + i for i in range(args.seeds)]
+    os.makedirs(args.out_dir, exist_ok=True)
+    # longest benches first, unknown ones being assumed long
+    times = load_times(args.out_dir)
+    order = sorted(benches, key=lambda b: -times.get(b, float('inf')))
+    print('Running {} benches x {} seeds (base seed {}) on {} processes'.format(
+        len(benches), len(seeds), base_seed, args.jobs))
+
+    start = time.perf_counter()
+    jobs = []
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_job, bench, seed, args)
+                   for bench in order for seed in seeds]
+        for future in as_completed(futures):
+            job = collect(future.result())
+            status = 'FAIL' if any(t['status'] == 'FAIL' for t in job['tests']) else 'PASS'
+            print('[{:3}/{}] {} {} seed {} in {:.1f} s'.format(
+                len(jobs) + 1, len(futures), status, job['bench'], job['seed'],
+                job['wall_time']))
+            jobs.append(job)
+    elapsed = time.perf_counter() - start
+
+    jobs.sort(key=lambda job: (job['bench'], job['seed']))
+    write_merged_results(jobs, pathlib.Path(args.out_dir) / 'results.xml')
+    save_times(args.out_dir, jobs)
+    print_report(jobs, args, elapsed)
+    failed = any(t['status'] == 'FAIL' for job in jobs for t in job['tests'])
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,11 @@
+'''Seed the global numpy random generator with the cocotb random seed.
+
+regress.py runs each bench with MODULE=seed_numpy,<bench module> so that the
+numpy stimulus of the benches, like that of the python random module cocotb
+already seeds, is reproduced by running again with the same RANDOM_SEED.
+'''
+
+import cocotb
+import numpy as np
+
+np.random.seed(cocotb.RANDOM_SEED % 2**32)
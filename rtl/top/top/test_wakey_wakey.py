@@ -10,6 +10,9 @@ sys.path.append('../../../py/')
 import numpy_arch as na
 import pdm
 import aco
+import golden_vectors
+import bus
+import cfg_image
 
 sys.path.append('../../../test/pdm_capture_test/py/')
 import parse_mic_data
@@ -40,26 +43,6 @@ INT32_MIN = np.iinfo(np.int32).min
 INT32_MAX = np.iinfo(np.int32).max
 
 
-# ==============================================================================
-# General Utilities
-# ==============================================================================
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
-
 # ==============================================================================
 # Wishbone Transactions
 # ==============================================================================
@@ -309,7 +292,7 @@ async def write_input_features(dut, x):
     await FallingEdge(dut.clk_i)
     dut.valid_i <= 1
     for i in range(n_frames):
-        dut.data_i <= np2bv(x[i,:])
+        dut.data_i <= bus.np2bv(x[i,:])
         if i == n_frames - 1:
             dut.last_i <= 1
         await FallingEdge(dut.clk_i)
@@ -332,8 +315,9 @@ async def write_pdm_input(dut, x):
     dut.vad_i <= 0  # de-assert VAD
     dut.pdm_data_i <= 0
 
-PCM_SPACING = 3  # cycles between writing another PCM input
-                 # must be >= 3 so the FFT isn't over utilised
+# cycles between writing another PCM input, must be >= 3 so the FFT isn't
+# over utilised
+PCM_SPACING = int(cocotb.plusargs.get('pcm_spacing', 3))
 async def write_pcm_input(dut, x):
     '''Write a PCM audio stream directly to ACO.'''
     while (dut.wrd_inst.wake_valid.value != 0):  # wait for wake to clear
@@ -415,9 +399,7 @@ async def read_fc_output(dut, expected):
     await FallingEdge(dut.clk_i)
     while (dut.wrd_inst.fc_valid != 1):  # wait until valid output
         await FallingEdge(dut.clk_i)
-    binstr = dut.wrd_inst.fc_data.value.get_binstr()
-    split_binstr = [binstr[32:], binstr[:32]]
-    output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+    output_arr = bus.bv2np(dut.wrd_inst.fc_data.value, n_bits=32)[::-1]  # class 0 is the low word
 
     if ENABLE_ASSERTS:
         for i in range(2):
@@ -542,6 +524,12 @@ def get_fixed_input2():
 # ==================== Writing generated inputs ====================
 
 async def write_mem_params(dut, p):
+    # +cfg_load=sequential|burst|backdoor, see py/cfg_image.py
+    mode = cocotb.plusargs.get('cfg_load', 'sequential')
+    if mode != 'sequential':
+        await cfg_image.load(dut, dut.wrd_inst, p, mode)
+        return
+
     c1w, c1b, c1s, c2w, c2b, c2s, fcw, fcb = p
     await write_conv_mem(dut, 1, c1w, c1b, c1s)
     await write_conv_mem(dut, 2, c2w, c2b, c2s)
@@ -643,9 +631,12 @@ async def do_pdm_test(dut, pdm_fname):
 N_FRAMES = 50  # frames 
 FFT_LEN = 256
 RFFT_LEN = int(FFT_LEN / 2 + 1)
+# check the FFT against fft_model exactly in a single pass, rather than within
+# a threshold and then again with the DUT FFT output fed to the model, once
+# the fft and fft_wrapper benches show the model is bit-accurate
+FFT_EXACT = bool(int(cocotb.plusargs.get('fft_exact', 0)))
 async def check_fft(dut, y, test_num):
-    # threshold = 10  # maximum difference between expected and actual
-    threshold = 100  # maximum difference between expected and actual
+    threshold = 0 if FFT_EXACT else 100  # maximum difference between expected and actual
     full_sig = np.zeros((N_FRAMES, RFFT_LEN), dtype=np.cdouble)
     for i in range(N_FRAMES):
         while (dut.aco_inst.fft_valid_o != 1):  # wait until output is valid
@@ -653,9 +644,7 @@ async def check_fft(dut, y, test_num):
         sig = np.zeros(RFFT_LEN, dtype=np.cdouble)
         for j in range(RFFT_LEN):
             await Timer(1, units='us')
-            binstr = dut.aco_inst.fft_data_o.value.get_binstr()
-            split_binstr = [binstr[:21], binstr[21:]]
-            output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+            output_arr = bus.bv2np(dut.aco_inst.fft_data_o.value, n_bits=21)
             sig[j] = output_arr[0] + output_arr[1] * 1j
             if j == RFFT_LEN - 1:
                 assert dut.aco_inst.fft_last_o == 1
@@ -683,11 +672,8 @@ async def check_final(dut, y, test_num):
     for i in range(N_FRAMES):
         await Timer(1, units='us')
         assert dut.aco_inst.valid_o == 1
-        binstr = dut.aco_inst.data_o.value.get_binstr()
-        for j in range(N_DCT):
-            section = binstr[j*8 : (j+1)*8]
-            sig[i, j] = BinaryValue(section).signed_integer
-            assert sig[i, j] == y[i,j]
+        sig[i] = bus.bv2np(dut.aco_inst.data_o.value)
+        assert np.array_equal(sig[i], y[i])
         if i == N_FRAMES - 1:
             assert dut.aco_inst.last_o == 1
         else:
@@ -718,20 +704,17 @@ def plot_features(sigs, test_num, name):
 async def do_pcm_test_fft_correction(dut, pdm_fname, test_num):
     '''Correct for fft innacuracies.'''
     print('Starting pcm test with fft correction.')
-    x = np.load(pdm_fname, allow_pickle=True)
-    x = parse_mic_data.pad_pdm(x)  # pad half-second signal to 1 second
-    x = pdm.pdm_to_pcm(x, 2)
-    y = aco.aco(x)
+    v = golden_vectors.get_vectors(pdm_fname, parse_mic_data.pdm_file_to_pcm)
+    x = v['pcm']
     cocotb.fork(write_pcm_input(dut, x))  # change on falling edge of pdm clk
-    fft_out = await check_fft(dut, y[2], test_num)
-    wake_bad = await read_wake_no_assert(dut)
+    fft_out = await check_fft(dut, v['sigs'][2], test_num)
+    wake_bad = await read_wake_no_assert(dut)  # non-deterministic wake
 
     print('Running through with known fft value.')
     for i in range(8000):
         await FallingEdge(dut.clk_i)
     y = aco.aco(x, fft_override=fft_out)
     cocotb.fork(write_pcm_input(dut, x))  # change on falling edge of pdm clk
-    # fft_out = await check_fft(dut, y[2], test_num)
     cocotb.fork(check_final(dut, y[8], test_num))
     aco_out = y[-1]
     aco_out = aco_out.reshape((int(aco_out.size / 13), 13))
@@ -742,10 +725,26 @@ async def do_pcm_test_fft_correction(dut, pdm_fname, test_num):
     print('Finished test.')
     return wake_expected  # assert ensured expected is observed
 
+async def do_pcm_test_checked(dut, pdm_fname, test_num):
+    '''Check the FFT and final ACO outputs and the wake output against the
+    software model in a single pass, needs fft_model to be bit-accurate.'''
+    print('Starting pcm test with ACO checks.')
+    v = golden_vectors.get_vectors(pdm_fname, parse_mic_data.pdm_file_to_pcm)
+    y = aco.aco(v['pcm'], exact_fft=True)  # the golden vectors use the float FFT
+    cocotb.fork(write_pcm_input(dut, v['pcm']))  # change on falling edge of pdm clk
+    cocotb.fork(check_final(dut, y[8], test_num))
+    await check_fft(dut, y[2], test_num)
+    aco_out = y[-1]
+    aco_out = aco_out.reshape((int(aco_out.size / 13), 13))
+    wrd_out = na.get_numpy_pred(aco_out)[0]
+    wake_expected = (wrd_out[0] > wrd_out[1])
+
+    await read_wake(dut, wake_expected)
+    print('Finished test.')
+    return wake_expected  # assert ensured expected is observed
+
 async def do_pcm_test(dut, pdm_fname):
-    x = np.load(pdm_fname, allow_pickle=True)
-    x = parse_mic_data.pad_pdm(x)  # pad half-second signal to 1 second
-    x = pdm.pdm_to_pcm(x, 2)
+    x = parse_mic_data.pdm_file_to_pcm(pdm_fname)  # padded to 1 second
     cocotb.fork(write_pcm_input(dut, x))  # change on falling edge of pdm clk
     wake = await read_wake_no_assert(dut)
     return wake
@@ -942,7 +941,10 @@ async def test_wakey_wakey(dut):
         print('=' * 100)
         print('Beginning end-to-end test {}/{} '.format(test_num, n_tests-1))
         print('=' * 100)
-        wake = await do_pcm_test_fft_correction(dut, fnames[test_num], test_num)
+        if FFT_EXACT:
+            wake = await do_pcm_test_checked(dut, fnames[test_num], test_num)
+        else:
+            wake = await do_pcm_test_fft_correction(dut, fnames[test_num], test_num)
         # wake = await do_pcm_test(dut, fnames[test_num])
         if wake != wakes_expected[test_num]:
             print('DUT output of {} when expected {}'.format(wake, wakes_expected[test_num]))
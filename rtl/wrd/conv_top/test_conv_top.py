@@ -11,6 +11,7 @@ from cocotb.binary import BinaryValue
 import sys
 sys.path.append('../../../py/')
 import numpy_arch as na
+import bus
 
 DUT_VECTOR_SIZE = 2
 
@@ -21,23 +22,6 @@ INT32_MAX = np.iinfo(np.int32).max
 
 ENABLE_ASSERTS = True
 
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
-
 async def write_conv_mem(dut, weights, biases, shift):
     '''Write weights and biases to the convolution memory.
 
@@ -54,13 +38,13 @@ async def write_conv_mem(dut, weights, biases, shift):
         for k in range(n_filters):
             dut.rd_wr_bank_i <= filter_width - i - 1  # bank2 is earlier in frame time
             dut.rd_wr_addr_i <= k
-            dut.wr_data_i <= np2bv(weights[i,:,k])
+            dut.wr_data_i <= bus.np2bv(weights[i,:,k])
             await FallingEdge(dut.clk_i)
     # write biases
     dut.rd_wr_bank_i <= filter_width
     for k in range(n_filters):
         dut.rd_wr_addr_i <= k
-        # dut.wr_data_i <= np2bv(biases[k])
+        # dut.wr_data_i <= bus.np2bv(biases[k])
         dut.wr_data_i <= int(biases[k])
         await FallingEdge(dut.clk_i)
     # write shift
@@ -86,7 +70,7 @@ async def write_input_features(dut, x):
     await FallingEdge(dut.clk_i)
     dut.valid_i <= 1
     for i in range(n_frames_pad):
-        dut.data_i <= np2bv(x_pad[i,:])
+        dut.data_i <= bus.np2bv(x_pad[i,:])
         if i == n_frames_pad - 1:
             dut.last_i <= 1
         await FallingEdge(dut.clk_i)
@@ -8,24 +8,11 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge
 from cocotb.binary import BinaryValue
 
-DUT_VECTOR_SIZE = 13
-
-
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
+import sys
+sys.path.append('../../../py/')
+import bus
 
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
+DUT_VECTOR_SIZE = 13
 
 
 @cocotb.test()
@@ -38,9 +25,9 @@ async def test_vec_mul(dut):
     # Reset system
     await FallingEdge(dut.clk_i)
     dut.rst_n_i <= 0
-    dut.data0_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
-    dut.data1_w_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
-    dut.data1_b_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
+    dut.data0_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
+    dut.data1_w_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
+    dut.data1_b_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
     dut.last0_i <= 0
     dut.last1_i <= 0
     dut.valid0_i <= 0
@@ -49,9 +36,9 @@ async def test_vec_mul(dut):
 
     await FallingEdge(dut.clk_i)
     dut.rst_n_i <= 1
-    dut.data0_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
-    dut.data1_w_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
-    dut.data1_b_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
+    dut.data0_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
+    dut.data1_w_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
+    dut.data1_b_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int8))
     dut.ready_i <= 1
 
     # Generate random values and compare results
@@ -84,7 +71,7 @@ async def test_vec_mul(dut):
         dut.data1_b_i <= val3
 
         #  mult = val1.astype(np.int16) * val2.astype(np.int16)
-        #  expected = np2bv(mult, n_bits=16)
+        #  expected = bus.np2bv(mult, n_bits=16)
 
         await FallingEdge(dut.clk_i)
         for j in range(DUT_VECTOR_SIZE):
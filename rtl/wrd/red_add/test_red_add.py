@@ -8,24 +8,11 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge
 from cocotb.binary import BinaryValue
 
-DUT_VECTOR_SIZE = 2
-
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
+import sys
+sys.path.append('../../../py/')
+import bus
 
+DUT_VECTOR_SIZE = 2
 
 @cocotb.test()
 async def test_flat_sum(dut):
@@ -37,7 +24,7 @@ async def test_flat_sum(dut):
     # Reset system
     await FallingEdge(dut.clk_i)
     dut.rst_n_i <= 0
-    dut.data_i  <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int32), 18)
+    dut.data_i  <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int32), 18)
     dut.last_i  <= 0
     dut.valid_i <= 0
     dut.ready_i <= 0
@@ -52,11 +39,11 @@ async def test_flat_sum(dut):
         val0 = np.random.randint(-2 ** 17, 2 ** 17 - 1, size=DUT_VECTOR_SIZE,
                                  dtype=np.int32)
 
-        dut.data_i <= np2bv(val0, 18)
+        dut.data_i <= bus.np2bv(val0, 18)
         dut.valid_i <= 1
 
         add = np.asarray([np.sum(val0)])
-        expected = np2bv(add, n_bits=32).value
+        expected = bus.np2bv(add, n_bits=32).value
 
         await FallingEdge(dut.clk_i)
         observed = dut.data_o.value
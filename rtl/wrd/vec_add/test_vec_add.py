@@ -8,24 +8,11 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge
 from cocotb.binary import BinaryValue
 
-DUT_VECTOR_SIZE = 13
-
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
+import sys
+sys.path.append('../../../py/')
+import bus
 
+DUT_VECTOR_SIZE = 13
 
 @cocotb.test()
 async def test_vec_add(dut):
@@ -37,9 +24,9 @@ async def test_vec_add(dut):
     # Reset system
     await FallingEdge(dut.clk_i)
     dut.rst_n_i <= 0
-    dut.data0_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
-    dut.data1_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
-    dut.data2_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
+    dut.data0_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
+    dut.data1_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
+    dut.data2_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
     dut.last0_i <= 0
     dut.last1_i <= 0
     dut.last2_i <= 0
@@ -50,9 +37,9 @@ async def test_vec_add(dut):
 
     await FallingEdge(dut.clk_i)
     dut.rst_n_i <= 1
-    dut.data0_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
-    dut.data1_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
-    dut.data2_i <= np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
+    dut.data0_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
+    dut.data1_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
+    dut.data2_i <= bus.np2bv(np.zeros(shape=DUT_VECTOR_SIZE, dtype=np.int16), 16)
     dut.ready_i <= 1
 
     # Generate random values and compare results
@@ -68,12 +55,12 @@ async def test_vec_add(dut):
         dut.valid1_i <= 1
         dut.valid2_i <= 1
 
-        dut.data0_i <= np2bv(val0, 16)
-        dut.data1_i <= np2bv(val1, 16)
-        dut.data2_i <= np2bv(val2, 16)
+        dut.data0_i <= bus.np2bv(val0, 16)
+        dut.data1_i <= bus.np2bv(val1, 16)
+        dut.data2_i <= bus.np2bv(val2, 16)
 
         add = val0.astype(np.int64) + val1.astype(np.int64) + val2.astype(np.int64)
-        expected = np2bv(add, n_bits=18)
+        expected = bus.np2bv(add, n_bits=18)
 
         await FallingEdge(dut.clk_i)
         for j in range(DUT_VECTOR_SIZE):
@@ -11,6 +11,7 @@ from cocotb.binary import BinaryValue
 import sys
 sys.path.append('../../../py/')
 import numpy_arch as na
+import bus
 
 DUT_VECTOR_SIZE = 2
 
@@ -21,23 +22,6 @@ INT32_MAX = np.iinfo(np.int32).max
 
 ENABLE_ASSERTS = True
 
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
-
 # ==================== Writing to dut ====================
 
 async def write_conv_mem(dut, conv_num, weights, biases, shift):
@@ -71,7 +55,7 @@ async def write_conv_mem(dut, conv_num, weights, biases, shift):
         for k in range(n_filters):
             rd_wr_bank_i <= filter_width - i - 1  # bank2 is earlier in frame time
             rd_wr_addr_i <= k
-            wr_data_i <= np2bv(weights[i,:,k])
+            wr_data_i <= bus.np2bv(weights[i,:,k])
             await FallingEdge(dut.clk_i)
     # write biases
     rd_wr_bank_i <= filter_width
@@ -135,7 +119,7 @@ async def write_input_features(dut, x):
     await FallingEdge(dut.clk_i)
     dut.valid_i <= 1
     for i in range(n_frames):
-        dut.data_i <= np2bv(x[i,:])
+        dut.data_i <= bus.np2bv(x[i,:])
         if i == n_frames - 1:
             dut.last_i <= 1
         await FallingEdge(dut.clk_i)
@@ -201,9 +185,7 @@ async def read_fc_output(dut, expected):
     await FallingEdge(dut.clk_i)
     while (dut.fc_valid != 1):  # wait until valid output
         await FallingEdge(dut.clk_i)
-    binstr = dut.fc_data.value.get_binstr()
-    split_binstr = [binstr[32:], binstr[:32]]
-    output_arr = [BinaryValue(x).signed_integer for x in split_binstr]
+    output_arr = bus.bv2np(dut.fc_data.value, n_bits=32)[::-1]  # class 0 is the low word
 
     if ENABLE_ASSERTS:
         for i in range(2):
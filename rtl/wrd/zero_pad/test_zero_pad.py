@@ -9,25 +9,13 @@ from cocotb.clock import Clock
 from cocotb.triggers import FallingEdge
 from cocotb.binary import BinaryValue
 
+import sys
+sys.path.append('../../../py/')
+import bus
+
 DUT_VECTOR_LENGTH = 13
 FRAME_LENGTH = 10
 
-def np2bv(int_arr, n_bits=8):
-    """ Convert a n_bits integer numpy array to cocotb BinaryValue """
-    # Step 1: Turn ndarray into a list of integers
-    int_list = int_arr.tolist()
-
-    # Step 2: Format each number as two's complement strings
-    binarized = [format(x & 2 ** n_bits - 1, f'0{n_bits}b') if x < 0 else
-                 format(x, f'0{n_bits}b')
-                 for x in int_list]
-
-    # Step 3: Join all strings into one large binary string
-    bin_string = ''.join(binarized)
-
-    # Step 4: Convert to cocotb BinaryValue and return
-    return BinaryValue(bin_string)
-
 @cocotb.test()
 async def test_zero_pad(dut):
     """ Test Rectified Linear Unit """
@@ -71,7 +59,7 @@ async def test_zero_pad(dut):
         observed = dut.data_o.value
         if i == 0 or i > FRAME_LENGTH:
             expected = 0
-        expected = np2bv(np.asarray([expected]), 8 * DUT_VECTOR_LENGTH)
+        expected = bus.np2bv(np.asarray([expected]), 8 * DUT_VECTOR_LENGTH)
         assert observed == expected,\
                "expected = %x, observed = %x" % (expected, observed)
 
@@ -95,7 +83,7 @@ async def test_zero_pad(dut):
         observed = dut.data_o.value
         if i == 0 or i > FRAME_LENGTH:
             expected = 0
-        expected = np2bv(np.asarray([expected]), 8 * DUT_VECTOR_LENGTH)
+        expected = bus.np2bv(np.asarray([expected]), 8 * DUT_VECTOR_LENGTH)
         assert observed == expected,\
                "expected = %x, observed = %x" % (expected, observed)
 
@@ -122,6 +110,6 @@ async def test_zero_pad(dut):
         observed = dut.data_o.value
         if i == 0 or i > FRAME_LENGTH:
             expected = 0
-        expected = np2bv(np.asarray([expected]), 8 * DUT_VECTOR_LENGTH)
+        expected = bus.np2bv(np.asarray([expected]), 8 * DUT_VECTOR_LENGTH)
         assert observed == expected,\
                "expected = %x, observed = %x" % (expected, observed)
@@ -12,6 +12,8 @@ sys.path.append(str(this_path / '../../../py/'))
 import pdm
 import aco
 import numpy_arch as na
+import wake_stream
+import golden_vectors
 
 TEENSY_PORT = '/dev/cu.usbmodem28376501'
 
@@ -23,8 +25,12 @@ ONE_SEC_LEN = 4000000
 # ONE_SEC_LEN = 2000000
 REC_LEN = 2000000
 
-def get_pdm(serial_port=None):
-    '''Parse the PDM bitstream into a numpy array of ones and zeros.'''
+def get_pdm(serial_port=None, packed=False):
+    '''Parse the PDM bitstream into a numpy array of ones and zeros.
+
+    If packed, return the captured bytes as is, 8 bits per byte in little
+    bit order, for use with the bit-packed models in pdm.py.
+    '''
     if serial_port is not None:
         import serial
         ser = serial.Serial(port=serial_port)
@@ -38,9 +44,29 @@ def get_pdm(serial_port=None):
     else:
         data = open('out.bin', 'rb').read()
     x_bytes = np.frombuffer(data, dtype='B')
+    if packed:
+        return x_bytes
     x = np.unpackbits(x_bytes, bitorder='little')
     return x
 
+def stream_pdm(serial_port, chunk_len=80000):
+    '''Continuously read the PDM bitstream, yielding chunk_len bits at a time.
+
+    Unlike get_pdm the port is kept open, so consecutive chunks are
+    contiguous in time. The default chunk is one 20 ms frame at 4 MHz.
+    '''
+    import serial
+    ser = serial.Serial(port=serial_port)
+    ser.timeout = 1
+    cleared = ser.read(ONE_SEC_LEN * 100)  # clear out buffer
+    print('cleared ', len(cleared), ' bytes')
+    ser.timeout = None
+    try:
+        while True:
+            data = ser.read(int(chunk_len / 8))
+            yield np.unpackbits(np.frombuffer(data, dtype='B'), bitorder='little')
+    finally:
+        ser.close()
 
 def process_pdm(x):
     '''Filter the PDM array three different ways and save .wav files.'''
@@ -65,6 +91,19 @@ def pad_pdm(x_pdm):
     x[-REC_LEN:] = x_pdm
     return x
 
+def pad_pdm_packed(x_pdm_packed):
+    '''Pad a short bit-packed pdm signal to length, see pad_pdm.'''
+    x = np.full(ONE_SEC_LEN // 8, 0xaa, dtype=np.uint8)  # alternating 0, 1
+    x[-(REC_LEN // 8):] = x_pdm_packed
+    return x
+
+def pdm_file_to_pcm(fname):
+    '''Load a saved pdm sample, pad it to one second and decimate it to PCM
+    with the bit-packed cic2 model of the DFE.'''
+    x = np.load(fname, allow_pickle=True)
+    x = pad_pdm_packed(pdm.pack_pdm(x))
+    return pdm.pdm_to_pcm_packed(x)
+
 maxes = {}
 log_maxes = {}
 def detect_max(arr, name):
@@ -91,20 +130,22 @@ def process_pdm_wake(source='mic', method='cic2'):
         x = x[:16000] / 2**8
         dfe_out = x
     elif source == 'mic':  # pdm microphone
-        x = get_pdm(serial_port=TEENSY_PORT)
-        x = pad_pdm(x)
+        x = get_pdm(serial_port=TEENSY_PORT, packed=True)
+        x = pad_pdm_packed(x)
     elif source[-4:] == '.npy':  # saved pdm sample
         x = np.load(source, allow_pickle=True)
-        x = pad_pdm(x)
+        x = pad_pdm_packed(pdm.pack_pdm(x))
     else:
         raise Exception('unkown source ' + source)
     if source[-4:] != '.wav':  # process pdm to pcm if not a wav file
+        if method != 'cic2':  # only cic2 has a bit-packed model
+            x = pdm.unpack_pdm(x)
         if method == 'cic1':
             dfe_out = pdm.pdm_to_pcm(x, 1).astype(np.int16)
             dfe_out *= 8
             dfe_out = np.clip(dfe_out, -128, 127).astype(np.int8)
         elif method == 'cic2':
-            dfe_out = pdm.pdm_to_pcm(x, 2)
+            dfe_out = pdm.pdm_to_pcm_packed(x)
             # dfe_out = dfe_out / 2**5  # scaling now in pdm.py
             # dfe_out = np.clip(dfe_out, -128, 127).astype(np.int8)
         elif method == 'ideal':  # ideal decimation
@@ -132,9 +173,22 @@ def process_pdm_wake(source='mic', method='cic2'):
         print('sleep.')
     return x, dfe_out, wake
 
-def process_pdm_wake_continuous():
-    while True:
-        process_pdm_wake()
+def process_pdm_wake_continuous(hop=5, chunks=None):
+    '''Run the streaming detector on a continuous capture from the mic.
+
+    The window is rescored every hop frames (20 ms each). chunks is an
+    iterable of PDM bit arrays, read from the mic if None.
+    '''
+    if chunks is None:
+        chunks = stream_pdm(TEENSY_PORT)
+    decimator = pdm.CicDecimator()
+    detector = wake_stream.WakeStream(hop=hop)
+    wakes = []
+    for x in chunks:
+        for n_frames, wake, logits in detector.push(decimator.process(x)):
+            print('WAKE!' if wake else 'sleep.')
+            wakes.append((n_frames, wake))
+    return wakes
 
 def save_rec(x):
     x = x.astype(np.float32)
@@ -190,7 +244,11 @@ def eval_pipeline(method='cic2'):
             full_path = str(in_dir/fname)
             paths.append(full_path)
             print('Processing', full_path, ': ', end='')
-            wake = process_pdm_wake(source=full_path, method=method)[-1]
+            if method == 'cic2':  # same pipeline as the RTL, use golden vectors
+                wake = golden_vectors.get_vectors(full_path, pdm_file_to_pcm)['wake']
+                print('WAKE!' if wake else 'sleep.')
+            else:
+                wake = process_pdm_wake(source=full_path, method=method)[-1]
             wakes.append(wake)
             if category == 'yes/':
                 if wake: